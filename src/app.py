@@ -3,15 +3,18 @@ import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, Header, Depends, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 # --- Local Imports ---
 from src.rag.rag_pipeline import RagPipeline
-from src.rag.vector_store import PineconeVectorStore  # Adjust if location differs
-from src.config import SUPABASE_URL
+from src.rag.vector_store import PineconeVectorStore, LocalVectorStore, ReplicaVectorStore  # Adjust if location differs
+from src.rag.snapshot import SnapshotError
+from src.config import SUPABASE_URL, VECTOR_BACKEND, VECTOR_SNAPSHOT_PATH, PINECONE_LAZY_INIT, RERANKER_ENABLED, WARMUP_MODE
 from src.auth import get_current_user
+from src.http_client import create_http_client
 
 # Load environment variables
 load_dotenv()
@@ -23,11 +26,51 @@ rag_pipeline_instance: RagPipeline | None = None
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global rag_pipeline_instance
+    if WARMUP_MODE not in ("off", "blocking", "background"):
+        raise ValueError(f"Unknown WARMUP_MODE: {WARMUP_MODE} (expected off, blocking or background)")
+    # One pooled client for all outbound HTTP (Supabase auth, OpenAI).
+    app.state.http_client = create_http_client()
     print("Application startup: Initializing RAG Pipeline...")
-    vector_store = PineconeVectorStore(user_id="orgvitality-default")
-    rag_pipeline_instance = RagPipeline(vector_store=vector_store, use_reranker=False)
-    print("[INFO] Asynchronous RagPipeline initialized (reranking is DISABLED).")
+    if VECTOR_BACKEND == "local":
+        vector_store = LocalVectorStore.from_snapshot(VECTOR_SNAPSHOT_PATH)
+    elif VECTOR_BACKEND == "replica":
+        try:
+            replica = LocalVectorStore.from_snapshot(VECTOR_SNAPSHOT_PATH)
+        except SnapshotError as e:
+            print(f"[WARNING] No usable local replica ({e}); queries will go to Pinecone.")
+            replica = None
+        vector_store = ReplicaVectorStore(
+            replica, lambda: PineconeVectorStore(user_id="orgvitality-default", http_client=app.state.http_client)
+        )
+    else:
+        vector_store = PineconeVectorStore(
+            user_id="orgvitality-default", lazy=PINECONE_LAZY_INIT, http_client=app.state.http_client
+        )
+        if PINECONE_LAZY_INIT:
+            # Existence check + stats run in the background (retrying until they succeed); /healthz reports when done.
+            app.state.vector_store_init = asyncio.create_task(vector_store.initialize_async())
+    rag_pipeline_instance = RagPipeline(vector_store=vector_store, use_reranker=RERANKER_ENABLED, http_client=app.state.http_client)
+    print(f"[INFO] Asynchronous RagPipeline initialized (reranking is {'ENABLED' if RERANKER_ENABLED else 'DISABLED'}).")
+
+    # Readiness (/healthz) waits for warmup unless it is turned off.
+    app.state.warmup_done = WARMUP_MODE == "off"
+
+    async def run_warmup():
+        # Not gated on the background Pinecone init: that retries until it succeeds, and
+        # warmup's dummy query is itself enough to mark the store ready.
+        await rag_pipeline_instance.warmup()
+        app.state.warmup_done = True
+
+    if WARMUP_MODE == "blocking":
+        await run_warmup()
+    elif WARMUP_MODE == "background":
+        app.state.warmup_task = asyncio.create_task(run_warmup())
     yield
+    init_task = getattr(app.state, "vector_store_init", None)
+    if init_task is not None:
+        init_task.cancel()
+    rag_pipeline_instance.inference_executor.shutdown(wait=False)
+    await app.state.http_client.aclose()
     print("Application shutdown.")
 
 app = FastAPI(lifespan=lifespan)
@@ -70,6 +113,47 @@ async def test_auth(request: Request):
     user = await get_current_user(request)
     return {"user": user}
 
+# --- Health / readiness ---
+@app.get("/healthz")
+async def healthz(request: Request):
+    if not rag_pipeline_instance:
+        raise HTTPException(status_code=503, detail="RAG pipeline not initialized.")
+    store = rag_pipeline_instance.vector_store
+    status = {
+        "vector_store": {
+            "index": store.index_name,
+            "ready": store.ready,
+            "error": getattr(store, "init_error", None),
+        },
+        "warmup": {
+            "mode": WARMUP_MODE,
+            "done": request.app.state.warmup_done,
+            "steps": rag_pipeline_instance.warmup_report,
+        },
+        # use_reranker turns False if the model could not be loaded
+        "reranker": {
+            "enabled": rag_pipeline_instance.use_reranker,
+            "backend": rag_pipeline_instance.reranker_backend,
+            "loaded": rag_pipeline_instance.cross_encoder is not None,
+        },
+        "inference_executor": rag_pipeline_instance.inference_executor.stats(),
+        "rerank_batcher": rag_pipeline_instance.rerank_batcher.stats() if rag_pipeline_instance.rerank_batcher else None,
+    }
+    if not (store.ready and request.app.state.warmup_done):
+        raise HTTPException(status_code=503, detail=status)
+    return {"status": "ok", **status}
+
+@app.get("/cache-stats")
+async def cache_stats():
+    if not rag_pipeline_instance:
+        raise HTTPException(status_code=503, detail="RAG pipeline not initialized.")
+    return rag_pipeline_instance.cache_stats()
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format: stage/request latency histograms from src/rag/metrics.py
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # --- Public Test Endpoint (uses API key) ---
 @app.post("/test-answer")
 async def test_answer(
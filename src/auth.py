@@ -1,10 +1,136 @@
+import asyncio
+import hashlib
+import logging
+import time
+
 from fastapi import Request, HTTPException, status
 import httpx
-from src.config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+import jwt
+from src.config import (
+    SUPABASE_URL, SUPABASE_SERVICE_KEY, SUPABASE_JWT_SECRET, SUPABASE_JWKS_URL,
+    SUPABASE_JWT_AUDIENCE, JWKS_CACHE_TTL_SECONDS, JWKS_MIN_REFRESH_INTERVAL_SECONDS, AUTH_TOKEN_CACHE_SIZE, AUTH_REMOTE_FALLBACK,
+)
+from src.rag.cache import LRUCache
+
+# Already-validated tokens (keyed by SHA-256 of the token) -> (exp, user); entries are honoured until exp.
+_token_cache = LRUCache(max_size=AUTH_TOKEN_CACHE_SIZE)
+
+# Cached JWKS signing keys by kid, refreshed every JWKS_CACHE_TTL_SECONDS, or on an unknown kid
+# if the last fetch attempt is more than JWKS_MIN_REFRESH_INTERVAL_SECONDS old.
+_jwks_keys: dict[str, jwt.PyJWK] = {}
+_jwks_fetched_at = 0.0
+_jwks_attempted_at = float("-inf")
+_jwks_lock = asyncio.Lock()
+
+
+class _NoVerificationKey(Exception):
+    """Raised when no local key can verify a token (no secret / kid not in JWKS)."""
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+
+def _http_client(request: Request) -> httpx.AsyncClient:
+    """Returns the pooled client created in the app lifespan."""
+    return request.app.state.http_client
+
+
+async def _refresh_jwks(client: httpx.AsyncClient) -> None:
+    global _jwks_keys, _jwks_fetched_at, _jwks_attempted_at
+    # Failed fetches count too, so an unreachable JWKS endpoint isn't retried on every request.
+    _jwks_attempted_at = time.monotonic()
+    response = await client.get(SUPABASE_JWKS_URL, headers={"apikey": SUPABASE_SERVICE_KEY or ""})
+    response.raise_for_status()
+    keys = {}
+    for jwk in response.json().get("keys", []):
+        try:
+            keys[jwk["kid"]] = jwt.PyJWK(jwk)
+        except (KeyError, jwt.PyJWKError) as e:
+            logging.warning("Skipping unusable JWKS key: %s", e)
+    _jwks_keys, _jwks_fetched_at = keys, time.monotonic()
+
+
+def _needs_refresh(kid: str | None) -> bool:
+    now = time.monotonic()
+    if now - _jwks_attempted_at < JWKS_MIN_REFRESH_INTERVAL_SECONDS:
+        return False
+    return now - _jwks_fetched_at > JWKS_CACHE_TTL_SECONDS or kid not in _jwks_keys
+
+
+async def _get_jwks_key(client: httpx.AsyncClient, kid: str | None) -> jwt.PyJWK:
+    if _needs_refresh(kid):
+        async with _jwks_lock:
+            # Re-check after acquiring the lock; another request may have refreshed already.
+            if _needs_refresh(kid):
+                try:
+                    await _refresh_jwks(client)
+                except (httpx.HTTPError, ValueError) as e:
+                    logging.warning("Failed to fetch JWKS from %s: %s", SUPABASE_JWKS_URL, e)
+    if kid not in _jwks_keys:
+        raise _NoVerificationKey(f"No JWKS key for kid '{kid}'")
+    return _jwks_keys[kid]
+
+
+async def _verify_locally(client: httpx.AsyncClient, jwt_token: str) -> dict:
+    """Verifies signature, expiry and audience of a Supabase JWT without calling Supabase."""
+    header = jwt.get_unverified_header(jwt_token)
+    alg = header.get("alg")
+    # The header alg is attacker-controlled: the allowed algorithm always comes from the key.
+    if alg == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            raise _NoVerificationKey("SUPABASE_JWT_SECRET is not set")
+        key, allowed = SUPABASE_JWT_SECRET, "HS256"
+    else:
+        jwk = await _get_jwks_key(client, header.get("kid"))
+        key, allowed = jwk.key, jwk.algorithm_name
+    if alg != allowed:
+        raise jwt.InvalidAlgorithmError(f"Token alg '{alg}' does not match key alg '{allowed}'")
+
+    return jwt.decode(
+        jwt_token,
+        key,
+        algorithms=[allowed],
+        audience=SUPABASE_JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def _user_from_claims(claims: dict) -> dict:
+    """Shapes verified JWT claims like the Supabase /auth/v1/user response."""
+    return {
+        "id": claims["sub"],
+        "aud": claims.get("aud"),
+        "role": claims.get("role"),
+        "email": claims.get("email"),
+        "phone": claims.get("phone"),
+        "app_metadata": claims.get("app_metadata", {}),
+        "user_metadata": claims.get("user_metadata", {}),
+        "is_anonymous": claims.get("is_anonymous", False),
+    }
+
+
+async def _verify_remotely(client: httpx.AsyncClient, jwt_token: str) -> dict:
+    response = await client.get(
+        f"{SUPABASE_URL}/auth/v1/user",
+        headers={
+            "Authorization": f"Bearer {jwt_token}",
+            "apikey": SUPABASE_SERVICE_KEY
+        }
+    )
+
+    if response.status_code != 200:
+        raise _unauthorized("JWT validation failed")
+
+    return response.json()
+
 
 async def get_current_user(request: Request) -> dict:
     """
-    Extracts JWT from the Authorization header and verifies it with Supabase.
+    Extracts JWT from the Authorization header and verifies it locally
+    (SUPABASE_JWT_SECRET for HS256, cached JWKS otherwise). Validated tokens are
+    cached until they expire. Supabase is only called when no local key can
+    verify the token and AUTH_REMOTE_FALLBACK is enabled.
     Returns the user object on success, or raises HTTPException on failure.
     """
     auth_header = request.headers.get("Authorization")
@@ -14,18 +140,31 @@ async def get_current_user(request: Request) -> dict:
                             detail="Missing or invalid Authorization header")
 
     jwt_token = auth_header.removeprefix("Bearer ").strip()
+    cache_key = hashlib.sha256(jwt_token.encode("utf-8")).hexdigest()
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{SUPABASE_URL}/auth/v1/user",
-            headers={
-                "Authorization": f"Bearer {jwt_token}",
-                "apikey": SUPABASE_SERVICE_KEY
-            }
-        )
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        exp, user = cached
+        if exp > time.time():
+            return user
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                detail="JWT validation failed")
+    try:
+        claims = await _verify_locally(_http_client(request), jwt_token)
+    except jwt.ExpiredSignatureError:
+        raise _unauthorized("JWT has expired")
+    except jwt.PyJWTError:
+        raise _unauthorized("JWT validation failed")
+    except _NoVerificationKey as e:
+        if not AUTH_REMOTE_FALLBACK:
+            logging.warning("Cannot verify JWT locally and remote fallback is disabled: %s", e)
+            raise _unauthorized("JWT validation failed")
+        logging.info("Falling back to remote JWT validation: %s", e)
+        user = await _verify_remotely(_http_client(request), jwt_token)
+        # Only the unverified exp is available here; it bounds how long the remote result is trusted.
+        exp = jwt.decode(jwt_token, options={"verify_signature": False}).get("exp", 0)
+        _token_cache.set(cache_key, (exp, user))
+        return user
 
-        return response.json()
+    user = _user_from_claims(claims)
+    _token_cache.set(cache_key, (claims["exp"], user))
+    return user
@@ -10,12 +10,30 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 EMBEDDING_DIMENSION = 1536
 DEFAULT_PINECONE_USER_ID = "orgvitality-default"
 PINECONE_REGION = "us-east-1"
+# Index host (from the Pinecone console); lets the app connect without a control-plane lookup
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")
+# Defer the index existence check / stats to a background task at startup
+PINECONE_LAZY_INIT = os.getenv("PINECONE_LAZY_INIT", "true").lower() == "true"
+# The background check retries with exponential backoff, capped at this many seconds between attempts
+PINECONE_INIT_RETRY_MAX_SECONDS = float(os.getenv("PINECONE_INIT_RETRY_MAX_SECONDS", "60"))
+# Max concurrent async data-plane requests per process, and the REST API version they use
+PINECONE_MAX_CONCURRENCY = int(os.getenv("PINECONE_MAX_CONCURRENCY", "16"))
+PINECONE_API_VERSION = os.getenv("PINECONE_API_VERSION", "2025-04")
 DROPBOX_TOKEN = os.getenv("DROPBOX_TOKEN")
 
 # Supabase
 SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")  # Secure backend auth
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")  # HS256 signing secret for local verification
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_CACHE_TTL_SECONDS = float(os.getenv("JWKS_CACHE_TTL_SECONDS", "600"))
+# An unknown kid triggers a JWKS refetch at most this often (garbage tokens can't force fetches)
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+# Call Supabase /auth/v1/user when a token cannot be verified locally (no key available)
+AUTH_REMOTE_FALLBACK = os.getenv("AUTH_REMOTE_FALLBACK", "true").lower() == "true"
 
 # --- Base Paths ---
 PROJ_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -28,6 +46,15 @@ CHROMA_DIR = os.path.join(DATA_DIR, "chromadb")
 EVAL_DATA_DIR = os.path.join(DATA_DIR, "chatbot_eval_questions")
 COLLECTION_NAME = "orgvitality_chunks"
 EMBEDDING_MODEL = "text-embedding-3-small"
+# Every upsert rewrites a marker record in this Pinecone namespace (outside the searched
+# default namespace); app instances poll it to detect a re-populated index
+INDEX_GENERATION_NAMESPACE = os.getenv("INDEX_GENERATION_NAMESPACE", "__index_generation__")
+INDEX_GENERATION_POLL_SECONDS = float(os.getenv("INDEX_GENERATION_POLL_SECONDS", "60"))
+# "pinecone" (default), "local" (memory-mapped snapshot served by LocalVectorStore),
+# or "replica" (local snapshot with on-demand Pinecone fallback)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+# Path prefix of the local vector snapshot (<prefix>.vec / <prefix>.meta)
+VECTOR_SNAPSHOT_PATH = os.getenv("VECTOR_SNAPSHOT_PATH", os.path.join(PROCESSED_DATA_DIR, "vector_snapshot"))
 
 # --- ChromaDB Host (New) ---
 CHROMA_HOST = os.getenv("CHROMA_HOST", "http://localhost") # Default to localhost for local testing
@@ -53,6 +80,83 @@ SOURCE_NAMES = {
     "clueso": "Clueso Steps"
 }
 
+# --- Outbound HTTP (shared pooled client) ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# --- Retrieval ---
+# Maximum number of subqueries retrieved concurrently (1 = sequential)
+RETRIEVAL_CONCURRENCY = int(os.getenv("RETRIEVAL_CONCURRENCY", "4"))
+# Retrieve for the raw query while the expansion LLM call is still running
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+# Give up on query expansion after this many seconds (speculative mode only)
+EXPANSION_TIMEOUT_SECONDS = float(os.getenv("EXPANSION_TIMEOUT_SECONDS", "6"))
+# Skip the LLM expansion call for short, single-intent queries
+EXPANSION_BYPASS = os.getenv("EXPANSION_BYPASS", "true").lower() == "true"
+EXPANSION_BYPASS_MAX_WORDS = int(os.getenv("EXPANSION_BYPASS_MAX_WORDS", "12"))
+# Fuse BM25 results over the normalized chunks with dense results (reciprocal rank fusion)
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", "60"))
+# How per-subquery result lists are merged: "rrf" (rank-based) or "max" (best retrieval score)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf").lower()
+
+# --- Context assembly ---
+# Maximal marginal relevance over retrieved chunks to drop near-duplicates
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, lower = more diversity
+MMR_TOP_N = int(os.getenv("MMR_TOP_N", "10"))
+# Token budget for retrieved context in the answer prompt (replaces the fixed top-6 cut)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+# Stop packing once fewer tokens than this remain
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", "64"))
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "o200k_base")  # gpt-4o tokenizer
+
+# --- Reranking ---
+# Off until the ONNX export (scripts/export_onnx_reranker.py) ships with the image
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() == "true"
+# "onnx" (int8-quantized export, see scripts/export_onnx_reranker.py) or "torch" (sentence-transformers)
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "onnx").lower()
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", os.path.join(PROJ_ROOT, "models", "ms-marco-MiniLM-L-6-v2-int8"))
+# Query + chunk are truncated to this many tokens; pairs are scored in batches of RERANKER_BATCH_SIZE
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "256"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "32"))
+# Dedicated pool for CPU-bound inference/tokenization. Reranking is skipped (retrieval
+# order is used) when more than INFERENCE_MAX_PENDING tasks are running or queued.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "8"))
+# Micro-batching of rerank calls across concurrent requests: wait up to this long (0 = off)
+# or until this many query/chunk pairs are waiting, then score them in one batch
+RERANK_BATCH_WINDOW_MS = float(os.getenv("RERANK_BATCH_WINDOW_MS", "5"))
+RERANK_MAX_BATCH_PAIRS = int(os.getenv("RERANK_MAX_BATCH_PAIRS", "64"))
+
+# --- Startup ---
+# Warm the reranker, pooled OpenAI/vector store connections and tiktoken at startup:
+# "background" (default; /healthz reports 503 until done), "blocking" (before serving) or "off"
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").lower()
+
+# --- Caching ---
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EXPANSION_CACHE_SIZE = int(os.getenv("EXPANSION_CACHE_SIZE", "2048"))
+EXPANSION_CACHE_TTL_SECONDS = float(os.getenv("EXPANSION_CACHE_TTL_SECONDS", "604800"))
+# Optional SQLite file for persisting expansions across restarts (unset = memory only)
+EXPANSION_CACHE_PATH = os.getenv("EXPANSION_CACHE_PATH")
+# Cross-encoder scores keyed on (normalized query, chunk)
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_CACHE_TTL_SECONDS = float(os.getenv("RERANK_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+# Minimum cosine similarity between questions for a cached answer to be reused
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+# Upper bound on how long an answer is reused, even if no index change is detected
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Size of the pieces a cached answer is replayed in on the streaming endpoint
+ANSWER_REPLAY_CHUNK_CHARS = int(os.getenv("ANSWER_REPLAY_CHUNK_CHARS", "48"))
+
 # --- Prompt Configuration ---
 PROMPT_PATH = os.path.join(PROJ_ROOT, "src", "prompts.yml")
 
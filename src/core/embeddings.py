@@ -9,19 +9,36 @@ class OpenAIEmbedding:
     Usage:
         embedder = OpenAIEmbedding(model="text-embedding-3-small")
         vectors  = embedder.embed_texts(["hello", "world"])
+
+    Pass an `EmbeddingCache` (src/rag/cache.py) as `cache` to skip texts
+    that were embedded recently.
     """
-    def __init__(self, model: str = "text-embedding-3-small"):
+    def __init__(self, model: str = "text-embedding-3-small", cache=None):
         self.model  = model
         self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.cache  = cache
 
-    # automatic exponential back-off on rate-limit / transient errors
-    @backoff.on_exception(backoff.expo,
-                          (openai.RateLimitError, openai.APIError),
-                          max_tries=5)
     def embed_texts(self, texts: list[str]) -> list[list[float]]:
         """
         Returns one embedding vector per text, in the same order.
         """
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        vectors = [self.cache.get_vector(t, self.model) for t in texts]
+        misses  = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            fresh = self._embed_uncached([texts[i] for i in misses])
+            for i, v in zip(misses, fresh):
+                self.cache.set_vector(texts[i], self.model, v)
+                vectors[i] = v
+        return [v.tolist() if hasattr(v, "tolist") else v for v in vectors]
+
+    # automatic exponential back-off on rate-limit / transient errors
+    @backoff.on_exception(backoff.expo,
+                          (openai.RateLimitError, openai.APIError),
+                          max_tries=5)
+    def _embed_uncached(self, texts: list[str]) -> list[list[float]]:
         resp = self.client.embeddings.create(
             model=self.model,
             input=texts,
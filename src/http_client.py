@@ -0,0 +1,21 @@
+import httpx
+from src.config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_TIMEOUT_SECONDS, HTTP2_ENABLED,
+)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Builds the application-wide pooled HTTP client (keep-alive, optional HTTP/2).
+    Created once in the FastAPI lifespan and closed on shutdown.
+    """
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=5.0),
+    )
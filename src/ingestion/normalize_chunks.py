@@ -2,6 +2,7 @@ import json
 import os
 import time
 import re
+import tiktoken
 
 pptx_path = "data/processed/pptx_chunks.json"
 video_path = "data/processed/video_chunks.json"
@@ -9,6 +10,8 @@ clueso_path = "data/processed/clueso_grouped_blocks.json"
 out_path = "data/processed/all_chunks_normalized.json"
 
 STEP_PATTERN = re.compile(r"^step\s*1\b", re.IGNORECASE)
+# Token counts are precomputed with the answer model's encoding (gpt-4o) for context packing
+ENCODING = tiktoken.get_encoding("o200k_base")
 
 def normalize_pptx(slides):
     norm = []
@@ -120,9 +123,10 @@ if os.path.exists(clueso_path):
     with open(clueso_path) as f:
         all_norm += normalize_clueso(json.load(f))
 
-# Reassign chunk IDs globally
+# Reassign chunk IDs globally and record token counts
 for i, c in enumerate(all_norm):
     c["chunk_id"] = i + 1
+    c["token_count"] = len(ENCODING.encode(c["text"])) if isinstance(c["text"], str) else 0
 
 with open(out_path, "w") as f:
     json.dump(all_norm, f, indent=2)
@@ -28,9 +28,10 @@ for p in (PROJECT_ROOT, SRC_DIR):
 
 from core.ingestion import DocumentIngestor
 from core.embeddings import OpenAIEmbedding
+from rag.cache import EmbeddingCache
 from core.schema import DocumentBatch
 from rag.vector_store import PineconeVectorStore
-from config import DROPBOX_TOKEN  # <-- token now comes from central config
+from config import DROPBOX_TOKEN, EMBEDDING_CACHE_SIZE  # <-- token now comes from central config
 
 # ---------------------------------------------------------------------------
 LOGGER = logging.getLogger("batch_ingest")
@@ -113,7 +114,8 @@ def ingest_file(
 def main() -> None:
     dbx = dropbox.Dropbox(DROPBOX_TOKEN)
 
-    embedder = OpenAIEmbedding()
+    # Shared across files, so chunks repeated between documents are embedded once per run.
+    embedder = OpenAIEmbedding(cache=EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE))
     ingestor = DocumentIngestor()
     store    = PineconeVectorStore(user_id=USER_ID)
 
@@ -125,6 +127,7 @@ def main() -> None:
     for entry in list_files(dbx, ROOT_FOLDER):
         if entry.name in TARGETS and Path(entry.name).suffix.lower() in ALLOWED_EXT:
             ingest_file(dbx, entry, ingestor, embedder, store)
+    LOGGER.info("Embedding cache: %s", embedder.cache.stats())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+import asyncio
+from collections.abc import Callable
+
+from src.rag.executor import InferenceExecutor
+
+
+class MicroBatcher:
+    """
+    Coalesces reranker calls from concurrent requests into one inference batch.
+
+    Pairs submitted through `predict` are held for at most `max_wait_ms`
+    (or until `max_batch_pairs` are waiting), scored together on the
+    inference executor, and each caller gets back the slice of scores for its
+    own pairs. If the batch fails, or the executor refuses it
+    (ExecutorSaturated), every caller in the batch sees that exception.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[list[tuple[str, str]]], list[float]],
+        executor: InferenceExecutor,
+        max_batch_pairs: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        self._predict = predict
+        self.executor = executor
+        self.max_batch_pairs = max(1, max_batch_pairs)
+        self.max_wait = max_wait_ms / 1000
+        self._waiting: list[tuple[list[tuple[str, str]], asyncio.Future]] = []
+        self._waiting_pairs = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+        self.batches = 0
+        self.requests = 0
+        self.pairs = 0
+
+    async def predict(self, pairs: list[tuple[str, str]]) -> list[float]:
+        if not pairs:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiting.append((pairs, future))
+        self._waiting_pairs += len(pairs)
+        if self._waiting_pairs >= self.max_batch_pairs:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting, self._waiting_pairs = self._waiting, [], 0
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list[tuple[list[tuple[str, str]], asyncio.Future]]) -> None:
+        pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+        self.batches += 1
+        self.requests += len(batch)
+        self.pairs += len(pairs)
+        try:
+            scores = await self.executor.try_run(self._predict, pairs)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():  # Callers that gave up have a cancelled future
+                    future.set_exception(e)
+            return
+        offset = 0
+        for request_pairs, future in batch:
+            if not future.done():
+                future.set_result(list(scores[offset : offset + len(request_pairs)]))
+            offset += len(request_pairs)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_pairs": self.max_batch_pairs,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "requests": self.requests,
+            "pairs": self.pairs,
+            "mean_batch_pairs": self.pairs / self.batches if self.batches else 0.0,
+            "mean_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,99 @@
+import json
+import logging
+import re
+
+import numpy as np
+
+from src.rag.vector_store import to_chunk
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Function words that carry no retrieval signal in portal questions
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "the this to what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts, for exact-term matches ("Heat Map",
+    "Comment Explorer") that dense search can miss.
+
+    Postings are stored per term as parallel numpy arrays (doc ids, term
+    frequencies), so scoring a query is a handful of vectorized scatter-adds.
+    """
+
+    def __init__(self, texts: list[str], metadatas: list[dict], k1: float = 1.5, b: float = 0.75, ids: list[str] | None = None):
+        self.k1 = k1
+        self.b = b
+        self._metadatas = metadatas
+        self._ids = ids or [str(i) for i in range(len(texts))]
+        self._num_docs = len(texts)
+
+        postings: dict[str, dict[int, int]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        avg_length = float(doc_lengths.mean()) if len(texts) else 0.0
+        # Per-document length normalization term, precomputed once
+        self._length_norm = k1 * (1 - b + b * doc_lengths / (avg_length or 1.0))
+        self._postings = {
+            term: (
+                np.fromiter(counts.keys(), dtype=np.int32, count=len(counts)),
+                np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+            )
+            for term, counts in postings.items()
+        }
+        self._idf = {
+            term: float(np.log(1 + (self._num_docs - len(ids) + 0.5) / (len(ids) + 0.5)))
+            for term, (ids, _) in self._postings.items()
+        }
+
+    @classmethod
+    def from_chunks_file(cls, path: str) -> "BM25Index":
+        """Builds the index from all_chunks_normalized.json, using the same metadata fields as the vector store."""
+        with open(path, "r") as f:
+            chunks = json.load(f)
+        chunks = [c for c in chunks if isinstance(c.get("text"), str) and c["text"].strip()]
+        metadatas = [
+            {"text": c["text"], "source": c.get("source", "N/A"), "source_detail": c.get("source_detail", "N/A")}
+            | ({"token_count": c["token_count"]} if "token_count" in c else {})
+            for c in chunks
+        ]
+        logging.info(f"Built BM25 index over {len(chunks)} chunks from {path}.")
+        return cls([c["text"] for c in chunks], metadatas, ids=[str(c.get("chunk_id", i)) for i, c in enumerate(chunks)])
+
+    def __len__(self) -> int:
+        return self._num_docs
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self._num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs = posting
+            scores[doc_ids] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + self._length_norm[doc_ids])
+        return scores
+
+    def query(self, query: str, top_k: int) -> list[dict]:
+        """Top-k chunks by BM25 score, in the same shape as `query_vectors` results (score is the BM25 score)."""
+        if not self._num_docs or top_k <= 0:
+            return []
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return []
+        k = min(top_k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [to_chunk(self._metadatas[i], score=scores[i], vector_id=self._ids[i]) for i in top]
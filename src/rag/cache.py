@@ -0,0 +1,345 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFKC, case-folded, single-spaced."""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache with a bounded size, LRU eviction and an
+    optional time-to-live. Tracks hit/miss/eviction counters for monitoring.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float | None = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            stored_at, value = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class EmbeddingCache(LRUCache):
+    """
+    Caches embedding vectors keyed on (model, normalized text).
+    Vectors are stored as float32 arrays rather than Python float lists.
+    """
+
+    @staticmethod
+    def _key(text: str, model: str) -> tuple[str, str]:
+        return model, normalize_text(text)
+
+    def get_vector(self, text: str, model: str) -> np.ndarray | None:
+        return self.get(self._key(text, model))
+
+    def set_vector(self, text: str, model: str, vector) -> None:
+        self.set(self._key(text, model), np.asarray(vector, dtype=np.float32))
+
+
+class RerankScoreCache(LRUCache):
+    """
+    Caches cross-encoder scores keyed on (model, normalized query, chunk).
+    A chunk is identified by its vector id plus a digest of its text, so a
+    re-ingested chunk that keeps its id is scored again.
+    """
+
+    @staticmethod
+    def _key(query: str, chunk: dict, model: str) -> tuple:
+        digest = hashlib.sha1(chunk["text"].encode("utf-8")).hexdigest()
+        return model, normalize_text(query), chunk.get("id"), digest
+
+    def get_scores(self, query: str, chunks: list[dict], model: str) -> list[float | None]:
+        return [self.get(self._key(query, chunk, model)) for chunk in chunks]
+
+    def set_scores(self, query: str, chunks: list[dict], model: str, scores) -> None:
+        for chunk, score in zip(chunks, scores):
+            self.set(self._key(query, chunk, model), float(score))
+
+
+class ExpansionCache(LRUCache):
+    """
+    Memoizes query-expansion output keyed on (prompt hash, normalized query).
+    Including the prompt hash means edits to the `query_expansion` prompt
+    invalidate old entries. With `path` set, entries are also persisted to a
+    SQLite file so they survive restarts and are shared between workers.
+    Disk errors are logged and treated as misses; the async variants keep
+    SQLite (and its busy-wait on a locked file) off the event loop.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float | None = None, path: str | None = None):
+        super().__init__(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.path = path
+        self._db = None
+        # Separate from the memory-tier lock so a busy disk never blocks in-memory hits.
+        self._db_lock = threading.Lock()
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS expansions "
+                    "(key TEXT PRIMARY KEY, subqueries TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.commit()
+
+    @staticmethod
+    def prompt_hash(*parts: str) -> str:
+        """Stable fingerprint of the prompt/model used to produce an expansion."""
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _key(query: str, prompt_hash: str) -> str:
+        return f"{prompt_hash}:{normalize_text(query)}"
+
+    def _load(self, key: str) -> list[str] | None:
+        """Reads `key` from the SQLite tier and promotes it to memory; None on a miss or disk error."""
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT subqueries, created_at FROM expansions WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds:
+                return None
+            subqueries = json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logging.warning("Failed to read query expansion from %s: %s", self.path, e)
+            return None
+        # Promote to the in-memory tier; the lookup before this already counted a miss.
+        super().set(key, subqueries)
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+        return subqueries
+
+    def get_subqueries(self, query: str, prompt_hash: str) -> list[str] | None:
+        key = self._key(query, prompt_hash)
+        subqueries = self.get(key)
+        if subqueries is not None or self._db is None:
+            return subqueries
+        return self._load(key)
+
+    async def aget_subqueries(self, query: str, prompt_hash: str) -> list[str] | None:
+        key = self._key(query, prompt_hash)
+        subqueries = self.get(key)
+        if subqueries is not None or self._db is None:
+            return subqueries
+        return await asyncio.to_thread(self._load, key)
+
+    def set_subqueries(self, query: str, prompt_hash: str, subqueries: list[str]) -> None:
+        key = self._key(query, prompt_hash)
+        self.set(key, subqueries)
+        if self._db is not None:
+            self._persist(key, subqueries)
+
+    async def aset_subqueries(self, query: str, prompt_hash: str, subqueries: list[str]) -> None:
+        key = self._key(query, prompt_hash)
+        self.set(key, subqueries)
+        if self._db is not None:
+            await asyncio.to_thread(self._persist, key, subqueries)
+
+    def _persist(self, key: str, subqueries: list[str]) -> None:
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO expansions (key, subqueries, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(subqueries), time.time()),
+                )
+                # Keep the on-disk store bounded as well.
+                self._db.execute(
+                    "DELETE FROM expansions WHERE key NOT IN "
+                    "(SELECT key FROM expansions ORDER BY created_at DESC LIMIT ?)",
+                    (self.max_size,),
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            logging.warning("Failed to persist query expansion to %s: %s", self.path, e)
+
+    def clear(self) -> None:
+        super().clear()
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM expansions")
+                    self._db.commit()
+            except sqlite3.Error as e:
+                logging.warning("Failed to clear query expansions in %s: %s", self.path, e)
+
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers keyed by question embedding. A lookup returns the
+    stored answer of the most similar cached question when its cosine
+    similarity clears `similarity_threshold`.
+
+    Question vectors live in a preallocated float32 matrix with unit-norm rows,
+    so a lookup is a single matrix-vector product. When full, the least
+    recently used entry is overwritten. Entries are tagged with the vector
+    index generation and dropped once the index is re-populated; with
+    `ttl_seconds` set, an entry is also not served once it is that old.
+    """
+
+    def __init__(self, max_size: int = 1024, similarity_threshold: float = 0.95, ttl_seconds: float | None = None):
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self._matrix: np.ndarray | None = None
+        self._answers: list[str | None] = [None] * max_size
+        self._questions: list[str | None] = [None] * max_size
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._stored_at = np.zeros(max_size, dtype=np.float64)
+        self._size = 0
+        self._generation: str | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray | None:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else None
+
+    def _best_match(self, vec: np.ndarray) -> tuple[int, float]:
+        sims = self._matrix[: self._size] @ vec
+        idx = int(np.argmax(sims))
+        return idx, float(sims[idx])
+
+    def sync_generation(self, generation: str | None) -> None:
+        """Clears the cache if the vector index has been re-populated since it was filled."""
+        with self._lock:
+            if generation != self._generation:
+                if self._size:
+                    logging.info("Vector index generation changed; clearing %d cached answers.", self._size)
+                self._clear_locked()
+                self._generation = generation
+
+    def lookup(self, vector) -> str | None:
+        vec = self._unit(vector)
+        with self._lock:
+            if vec is None or not self._size:
+                self.misses += 1
+                return None
+            idx, similarity = self._best_match(vec)
+            if similarity < self.similarity_threshold:
+                self.misses += 1
+                return None
+            if self.ttl_seconds is not None and time.monotonic() - self._stored_at[idx] > self.ttl_seconds:
+                # Expired; the next `store` for this question overwrites the slot.
+                self.misses += 1
+                return None
+            self._last_used[idx] = time.monotonic()
+            self.hits += 1
+            logging.info("Answer cache hit (similarity=%.3f) for cached question '%s'.", similarity, self._questions[idx])
+            return self._answers[idx]
+
+    def store(self, question: str, vector, answer: str) -> None:
+        vec = self._unit(vector)
+        if vec is None or not answer:
+            return
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, vec.shape[0]), dtype=np.float32)
+
+            if self._size:
+                idx, similarity = self._best_match(vec)
+                if similarity < self.similarity_threshold:
+                    idx = None
+            else:
+                idx = None
+
+            if idx is None:
+                if self._size < self.max_size:
+                    idx = self._size
+                    self._size += 1
+                else:
+                    idx = int(np.argmin(self._last_used))
+                    self.evictions += 1
+
+            self._matrix[idx] = vec
+            self._questions[idx] = question
+            self._answers[idx] = answer
+            self._last_used[idx] = self._stored_at[idx] = time.monotonic()
+
+    def _clear_locked(self) -> None:
+        self._size = 0
+        self._answers = [None] * self.max_size
+        self._questions = [None] * self.max_size
+        self._last_used[:] = 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear_locked()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
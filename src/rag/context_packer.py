@@ -0,0 +1,77 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+# Rough cost of the "[Source: ..., ...]" label and blank line added per chunk
+CHUNK_OVERHEAD_TOKENS = 16
+
+
+class CharEstimateEncoding:
+    """
+    Stand-in used when a tiktoken encoding cannot be loaded: one "token" per
+    `chars_per_token` characters (about right for English with o200k_base).
+    """
+
+    def __init__(self, chars_per_token: int = 4):
+        self.chars_per_token = chars_per_token
+
+    def encode(self, text: str) -> list[str]:
+        step = self.chars_per_token
+        return [text[i : i + step] for i in range(0, len(text), step)]
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str) -> tiktoken.Encoding | CharEstimateEncoding:
+    """
+    Loads (and memoizes) a tiktoken encoding. The BPE file is read from
+    TIKTOKEN_CACHE_DIR (baked into the image) or downloaded; if neither works,
+    packing falls back to a character-based estimate instead of failing requests.
+    """
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.error("Could not load tiktoken encoding '%s', estimating tokens from characters: %s", name, e)
+        return CharEstimateEncoding()
+
+
+def chunk_token_count(chunk: dict, encoding: tiktoken.Encoding | CharEstimateEncoding) -> int:
+    """Uses the count precomputed at ingestion when available, else counts now."""
+    count = chunk.get("metadata", {}).get("token_count")
+    if isinstance(count, (int, float)) and count > 0:
+        return int(count)
+    return len(encoding.encode(chunk["text"]))
+
+
+def pack_context(
+    chunks: list[dict],
+    token_budget: int,
+    encoding_name: str = "o200k_base",
+    min_chunk_tokens: int = 64,
+) -> tuple[list[dict], int]:
+    """
+    Fills `token_budget` with chunks in rank order. The first chunk that does
+    not fit is trimmed to the remaining budget (higher rank wins over a smaller,
+    lower-ranked chunk), and packing stops once fewer than `min_chunk_tokens`
+    remain. Returns (selected chunks, tokens used).
+    """
+    encoding = get_encoding(encoding_name)
+    selected, used = [], 0
+    for chunk in chunks:
+        remaining = token_budget - used - CHUNK_OVERHEAD_TOKENS
+        if remaining < min_chunk_tokens:
+            break
+        count = chunk_token_count(chunk, encoding)
+        if count <= remaining:
+            selected.append(chunk)
+            used += count + CHUNK_OVERHEAD_TOKENS
+            continue
+        tokens = encoding.encode(chunk["text"])[:remaining]
+        selected.append({**chunk, "text": encoding.decode(tokens), "truncated": True})
+        used += len(tokens) + CHUNK_OVERHEAD_TOKENS
+        logging.info("Trimmed chunk from %d to %d tokens to fit the context budget.", count, len(tokens))
+        break
+    return selected, used
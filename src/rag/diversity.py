@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def mmr_select(query_vector, candidate_vectors, top_n: int, lambda_mult: float = 0.7) -> list[int]:
+    """
+    Maximal marginal relevance: greedily picks candidates that are relevant to
+    the query but dissimilar to what is already selected.
+
+    score(i) = lambda * cos(q, c_i) - (1 - lambda) * max_{j in selected} cos(c_i, c_j)
+
+    lambda=1 is pure relevance order; lower values penalize near-duplicates
+    (e.g. overlapping token windows) harder. Returns candidate indices in
+    selection order.
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if candidates.ndim != 2 or not len(candidates) or top_n <= 0:
+        return []
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    candidates = candidates / norms
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_similarity = similarity[:, first].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[first] = False
+
+    while len(selected) < min(top_n, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(max_similarity, similarity[:, pick], out=max_similarity)
+    return selected
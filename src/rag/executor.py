@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised by `InferenceExecutor.try_run` when the pending-work limit is reached."""
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for CPU-bound model work (reranker inference and
+    model loading), kept apart from the default executor that I/O calls use.
+
+    `max_pending` caps work that is running or queued. `try_run` refuses new
+    work past that cap so callers can skip an optional stage instead of
+    queueing behind it; `run` always queues (for work that cannot be skipped).
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 8, name: str = "inference"):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _call(self, fn, *args, **kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _finished(self, future: Future) -> None:
+        # Runs when the work itself ends, not when the awaiting coroutine does: a caller
+        # cancelled mid-inference must not free its slot while the worker is still busy.
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    async def _submit(self, fn, *args, **kwargs):
+        try:
+            future = self._pool.submit(self._call, fn, *args, **kwargs)
+        except RuntimeError:  # Pool already shut down
+            with self._lock:
+                self._pending -= 1
+                self.failed += 1
+            raise
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs `fn` on the pool, waiting for a free worker if necessary."""
+        with self._lock:
+            self._pending += 1
+            self.peak_pending = max(self.peak_pending, self._pending)
+        return await self._submit(fn, *args, **kwargs)
+
+    async def try_run(self, fn, *args, **kwargs):
+        """Like `run`, but raises ExecutorSaturated instead of exceeding `max_pending`."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self._pending} inference tasks pending (limit {self.max_pending})")
+            self._pending += 1
+            self.peak_pending = max(self.peak_pending, self._pending)
+        return await self._submit(fn, *args, **kwargs)
+
+    @property
+    def queue_depth(self) -> int:
+        """Tasks submitted but not yet picked up by a worker."""
+        return max(0, self._pending - self._running)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": max(0, self._pending - self._running),
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        logging.info("Shutting down %d-worker inference executor.", self.max_workers)
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,34 @@
+from collections.abc import Callable
+
+
+def fuse_results(
+    result_lists: list[list[dict]],
+    method: str = "rrf",
+    key: Callable[[dict], str] = lambda chunk: chunk["text"],
+    k: int = 60,
+) -> list[dict]:
+    """
+    Fuses per-subquery result lists into one deduplicated ranking and records
+    the fused score on each chunk as "fusion_score".
+
+    - "rrf": reciprocal rank fusion; scale-free, rewards chunks several subqueries agree on.
+    - "max": best retrieval "score" the chunk got from any subquery (cosine for dense
+      hits); chunks without a score rank after scored ones.
+    Ties keep first-seen order.
+    """
+    fused: dict[str, float] = {}
+    first_seen: dict[str, dict] = {}
+    for results in result_lists:
+        for rank, item in enumerate(results, start=1):
+            item_key = key(item)
+            first_seen.setdefault(item_key, item)
+            if method == "rrf":
+                fused[item_key] = fused.get(item_key, 0.0) + 1.0 / (k + rank)
+            elif method == "max":
+                score = item.get("score")
+                score = float("-inf") if score is None else score
+                fused[item_key] = max(fused.get(item_key, float("-inf")), score)
+            else:
+                raise ValueError(f"Unknown fusion method: {method}")
+    order = sorted(fused, key=fused.get, reverse=True)
+    return [{**first_seen[item_key], "fusion_score": fused[item_key]} for item_key in order]
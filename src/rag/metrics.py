@@ -0,0 +1,121 @@
+"""Stage-level latency metrics for the RAG pipeline.
+
+Every timed stage is observed into a Prometheus histogram (served on
+/metrics) and, when it runs inside `request_trace`, appended to that
+request's record, which is logged as one JSON line when the request ends.
+The record lives in a context variable, so stages running in tasks spawned
+by the request (gathered subqueries, speculative retrieval) are included.
+"""
+import contextvars
+import functools
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Histogram
+
+# Upper bounds in seconds; the low end covers cache hits, the high end LLM calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_latency_seconds", "Latency of individual RAG pipeline stages.", ["stage"], buckets=LATENCY_BUCKETS
+)
+REQUEST_LATENCY = Histogram(
+    "rag_request_latency_seconds", "End-to-end latency of answer requests.", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds", "Time from request start to the first streamed answer token.", buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("rag_requests_total", "Answer requests by endpoint and outcome.", ["endpoint", "outcome"])
+
+timing_logger = logging.getLogger("rag.timing")
+_current_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("rag_request_trace", default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["stages"].append((stage, seconds))
+
+
+def annotate(**fields) -> None:
+    """Adds fields (e.g. cache_hit=True) to the current request's log record."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["fields"].update(fields)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def timed_stage(stage: str):
+    """Decorator form of `stage_timer` for coroutine functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_trace(endpoint: str) -> tuple[dict, contextvars.Token]:
+    trace = {
+        "request_id": uuid.uuid4().hex[:12],
+        "endpoint": endpoint,
+        "start": time.perf_counter(),
+        "stages": [],
+        "fields": {},
+    }
+    return trace, _current_trace.set(trace)
+
+
+def finish_trace(trace: dict, token: contextvars.Token, outcome: str = "ok") -> None:
+    """Observes the request latency and logs the request's stage timings as one JSON line."""
+    total = time.perf_counter() - trace["start"]
+    REQUEST_LATENCY.labels(endpoint=trace["endpoint"]).observe(total)
+    REQUESTS.labels(endpoint=trace["endpoint"], outcome=outcome).inc()
+    stages: dict[str, list[float]] = {}
+    for stage, seconds in trace["stages"]:
+        stages.setdefault(stage, []).append(round(seconds * 1000, 1))
+    timing_logger.info(json.dumps({
+        "event": "rag_request",
+        "request_id": trace["request_id"],
+        "endpoint": trace["endpoint"],
+        "outcome": outcome,
+        "total_ms": round(total * 1000, 1),
+        **trace["fields"],
+        "stages_ms": stages,
+    }))
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # A streaming generator can be finalized from a different context; nothing to restore there.
+        pass
+
+
+@contextmanager
+def request_trace(endpoint: str):
+    trace, token = start_trace(endpoint)
+    outcome = "error"
+    try:
+        yield trace
+        outcome = "ok"
+    finally:
+        finish_trace(trace, token, outcome)
+
+
+def observe_first_token(trace: dict) -> None:
+    """Records time-to-first-token for a streaming request, measured from the start of its trace."""
+    seconds = time.perf_counter() - trace["start"]
+    TIME_TO_FIRST_TOKEN.observe(seconds)
+    trace["fields"]["ttft_ms"] = round(seconds * 1000, 1)
@@ -0,0 +1,32 @@
+import re
+
+# Words/phrases that usually join two separate information needs
+CONJUNCTIONS = ("and", "or", "also", "as well as", "plus", "versus", "vs", "then", "both", "compared to")
+_WORD_RE = re.compile(r"\w+")
+_CONJUNCTION_RE = re.compile(r"\b(" + "|".join(re.escape(c) for c in CONJUNCTIONS) + r")\b", re.IGNORECASE)
+
+
+def needs_expansion(query: str, max_words: int = 12) -> tuple[bool, str]:
+    """
+    Cheap heuristic deciding whether a query is worth an LLM decomposition call.
+    Returns (decision, reason) so callers can log why expansion was skipped.
+    """
+    words = _WORD_RE.findall(query)
+    if not words:
+        return False, "empty query"
+
+    question_marks = query.count("?")
+    if question_marks > 1:
+        return True, f"{question_marks} question marks"
+
+    conjunctions = _CONJUNCTION_RE.findall(query)
+    if conjunctions:
+        return True, f"conjunction '{conjunctions[0].lower()}'"
+
+    if ";" in query or query.count(",") >= 2:
+        return True, "list-like punctuation"
+
+    if len(words) > max_words:
+        return True, f"{len(words)} words > {max_words}"
+
+    return False, f"{len(words)} words, single intent"
@@ -3,10 +3,33 @@ import json
 import yaml
 import logging
 import asyncio
-from sentence_transformers import CrossEncoder
+import os
+import time
 # Ensure this imports your PineconeVectorStore now
-from src.rag.vector_store import PineconeVectorStore # Assuming PineconeVectorStore is in here
-from src.config import OPENAI_API_KEY, PROMPT_PATH, EMBEDDING_MODEL # Added EMBEDDING_MODEL
+from src.rag.vector_store import PineconeVectorStore, LocalVectorStore, ReplicaVectorStore # Assuming PineconeVectorStore is in here
+from src.rag.query_classifier import needs_expansion
+from src.rag.bm25 import BM25Index
+from src.rag.fusion import fuse_results
+from src.rag.context_packer import pack_context, get_encoding
+from src.rag.diversity import mmr_select
+from src.rag.reranker import OnnxCrossEncoder
+from src.rag.executor import InferenceExecutor, ExecutorSaturated
+from src.rag.batching import MicroBatcher
+from src.rag.metrics import stage_timer, timed_stage, annotate, start_trace, finish_trace, request_trace, observe_first_token
+from src.rag.cache import EmbeddingCache, ExpansionCache, RerankScoreCache, SemanticAnswerCache, normalize_text
+from src.config import (
+    OPENAI_API_KEY, PROMPT_PATH, EMBEDDING_MODEL, RETRIEVAL_CONCURRENCY, NORMALIZED_CHUNKS_PATH,
+    HYBRID_RETRIEVAL, RRF_K, FUSION_METHOD, CONTEXT_TOKEN_BUDGET, CONTEXT_MIN_CHUNK_TOKENS, CONTEXT_ENCODING,
+    MMR_ENABLED, MMR_LAMBDA, MMR_TOP_N,
+    RERANKER_BACKEND, RERANKER_MODEL, RERANKER_ONNX_DIR, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE,
+    INFERENCE_WORKERS, INFERENCE_MAX_PENDING, RERANK_BATCH_WINDOW_MS, RERANK_MAX_BATCH_PAIRS,
+    SPECULATIVE_RETRIEVAL, EXPANSION_TIMEOUT_SECONDS, EXPANSION_BYPASS, EXPANSION_BYPASS_MAX_WORDS,
+    EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL_SECONDS,
+    EXPANSION_CACHE_SIZE, EXPANSION_CACHE_TTL_SECONDS, EXPANSION_CACHE_PATH,
+    RERANK_CACHE_SIZE, RERANK_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_SIZE, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_TTL_SECONDS, ANSWER_REPLAY_CHUNK_CHARS,
+    INDEX_GENERATION_POLL_SECONDS,
+)
 
 # --- Setup logging ---
 logging.basicConfig(
@@ -24,18 +47,82 @@ class RagPipeline:
     An asynchronous RAG (Retrieval-Augmented Generation) pipeline
     with lazy loading and a toggle for the reranker.
     """
-    def __init__(self, vector_store: PineconeVectorStore, prompts=None, reranker_model="cross-encoder/ms-marco-MiniLM-L-6-v2", use_reranker: bool = False):
+    def __init__(self, vector_store: PineconeVectorStore | LocalVectorStore | ReplicaVectorStore, prompts=None, reranker_model=RERANKER_MODEL, use_reranker: bool = False, reranker_backend: str = RERANKER_BACKEND, rerank_cache: RerankScoreCache | None = None, inference_executor: InferenceExecutor | None = None, retrieval_concurrency: int = RETRIEVAL_CONCURRENCY, embedding_cache: EmbeddingCache | None = None, expansion_cache: ExpansionCache | None = None, answer_cache: SemanticAnswerCache | None = None, speculative_retrieval: bool = SPECULATIVE_RETRIEVAL, expansion_timeout: float = EXPANSION_TIMEOUT_SECONDS, expansion_bypass: bool = EXPANSION_BYPASS, http_client=None, hybrid_retrieval: bool = HYBRID_RETRIEVAL, context_token_budget: int = CONTEXT_TOKEN_BUDGET, use_mmr: bool = MMR_ENABLED, mmr_lambda: float = MMR_LAMBDA, fusion_method: str = FUSION_METHOD):
         self.vector_store = vector_store
         self.prompts = prompts or load_prompts()
-        self.async_client = openai.AsyncClient(api_key=OPENAI_API_KEY)
+        # Reuse the app's pooled httpx client when one is provided.
+        self.async_client = openai.AsyncClient(api_key=OPENAI_API_KEY, http_client=http_client)
         self.embedding_model = EMBEDDING_MODEL # Use embedding model from config
+        # Upper bound on subqueries in flight at once; 1 restores sequential retrieval.
+        self.retrieval_concurrency = max(1, retrieval_concurrency)
+        # Repeated questions re-embed identical subqueries; keep recent vectors in-process.
+        self.embedding_cache = embedding_cache or EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE, ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS)
+        self.expansion_model = "gpt-4o"
+        self.expansion_cache = expansion_cache or ExpansionCache(max_size=EXPANSION_CACHE_SIZE, ttl_seconds=EXPANSION_CACHE_TTL_SECONDS, path=EXPANSION_CACHE_PATH)
+        # Editing the expansion prompt (or model) changes this hash and retires old cache entries.
+        self._expansion_prompt_hash = ExpansionCache.prompt_hash(
+            self.expansion_model,
+            self.prompts["query_expansion"]["system_prompt"],
+            self.prompts["query_expansion"]["user_prompt_template"],
+        )
+        # Retrieve for the raw query in parallel with expansion, and stop waiting
+        # for expansion after `expansion_timeout` seconds.
+        self.speculative_retrieval = speculative_retrieval
+        self.expansion_timeout = expansion_timeout
+        # Let a local heuristic skip expansion for simple queries.
+        self.expansion_bypass = expansion_bypass
+        # Retrieved context is packed up to this many tokens (see context_packer).
+        self.context_token_budget = context_token_budget
+        # MMR diversity stage over retrieved chunks; needs vectors back from the store.
+        self.use_mmr = use_mmr
+        self.mmr_lambda = mmr_lambda
+        # Merges the per-subquery result lists ("rrf" or "max"); see fusion.fuse_results.
+        if fusion_method not in ("rrf", "max"):
+            raise ValueError(f"Unknown fusion method: {fusion_method}")
+        self.fusion_method = fusion_method
+        # Lexical BM25 index fused with dense results; None when hybrid retrieval is off.
+        self.bm25_index = None
+        if hybrid_retrieval:
+            try:
+                self.bm25_index = BM25Index.from_chunks_file(NORMALIZED_CHUNKS_PATH)
+            except (OSError, ValueError) as e:
+                logging.warning("Hybrid retrieval disabled, could not build BM25 index: %s", e)
+        # Semantic cache of final answers; None disables it.
+        if answer_cache is None and ANSWER_CACHE_ENABLED:
+            answer_cache = SemanticAnswerCache(
+                max_size=ANSWER_CACHE_SIZE, similarity_threshold=ANSWER_CACHE_SIMILARITY, ttl_seconds=ANSWER_CACHE_TTL_SECONDS
+            )
+        self.answer_cache = answer_cache
+        # The index generation is polled in the background (see _poll_index_generation).
+        self._generation_checked_at = float("-inf")
+        self._generation_poll: asyncio.Task | None = None
 
         # --- MODIFIED ---
         # Added a flag to control reranking and still support lazy loading.
         self.use_reranker = use_reranker
         self.reranker_model_name = reranker_model
         self.cross_encoder = None
+        self._reranker_lock = asyncio.Lock()  # Warmup and first requests must not load the model twice
         # --- END MODIFIED ---
+        # Per-step timings (or errors) from `warmup`; None until it has run.
+        self.warmup_report: dict | None = None
+        # "onnx" (int8 ONNX export via onnxruntime) or "torch" (sentence-transformers CrossEncoder)
+        if reranker_backend not in ("onnx", "torch"):
+            raise ValueError(f"Unknown reranker backend: {reranker_backend}")
+        self.reranker_backend = reranker_backend
+        # Scores only change with the model/backend/truncation, so those are part of the cache key.
+        self._reranker_cache_key = f"{reranker_backend}:{reranker_model}:{RERANKER_MAX_LENGTH}"
+        self.rerank_cache = rerank_cache or RerankScoreCache(max_size=RERANK_CACHE_SIZE, ttl_seconds=RERANK_CACHE_TTL_SECONDS)
+        # Model loading, inference and tokenization run here, not on the default
+        # executor that blocking I/O shares.
+        self.inference_executor = inference_executor or InferenceExecutor(max_workers=INFERENCE_WORKERS, max_pending=INFERENCE_MAX_PENDING)
+        # Coalesces concurrent rerank calls into shared batches; None scores each call on its own.
+        self.rerank_batcher = None
+        if RERANK_BATCH_WINDOW_MS > 0:
+            self.rerank_batcher = MicroBatcher(
+                self._predict_pairs, self.inference_executor,
+                max_batch_pairs=RERANK_MAX_BATCH_PAIRS, max_wait_ms=RERANK_BATCH_WINDOW_MS,
+            )
 
         if self.use_reranker:
             logging.info("Asynchronous RagPipeline initialized (reranker will be loaded on first use).")
@@ -43,78 +130,242 @@ class RagPipeline:
             logging.info("Asynchronous RagPipeline initialized (reranking is DISABLED).")
 
     async def _load_reranker(self):
-        """Loads the CrossEncoder model on demand."""
+        """Loads the reranker model on demand."""
         # Only load if reranking is enabled and the model hasn't been loaded yet.
-        if self.use_reranker and self.cross_encoder is None:
-            logging.info(f"First use: Lazily loading reranker model '{self.reranker_model_name}'...")
-            # Run the synchronous, slow model loading in a separate thread
-            self.cross_encoder = await asyncio.to_thread(CrossEncoder, self.reranker_model_name)
+        if not self.use_reranker or self.cross_encoder is not None:
+            return
+        async with self._reranker_lock:
+            if not self.use_reranker or self.cross_encoder is not None:
+                return
+            logging.info(f"First use: Lazily loading {self.reranker_backend} reranker model '{self.reranker_model_name}'...")
+            # Run the synchronous, slow model loading on the inference executor
+            if self.reranker_backend == "onnx":
+                # Split the cores between executor workers so concurrent batches don't oversubscribe them.
+                threads = max(1, (os.cpu_count() or 1) // self.inference_executor.max_workers)
+                try:
+                    self.cross_encoder = await self.inference_executor.run(
+                        OnnxCrossEncoder, RERANKER_ONNX_DIR, max_length=RERANKER_MAX_LENGTH,
+                        batch_size=RERANKER_BATCH_SIZE, intra_op_threads=threads,
+                    )
+                except (OSError, ImportError) as e:
+                    # A missing export should degrade to retrieval order, not fail every request.
+                    logging.error("Could not load ONNX reranker, reranking is now DISABLED: %s", e)
+                    self.use_reranker = False
+                    return
+            else:
+                try:
+                    # Deferred: importing sentence_transformers pulls in torch + transformers (seconds, hundreds of MB).
+                    from sentence_transformers import CrossEncoder
+                    self.cross_encoder = await self.inference_executor.run(CrossEncoder, self.reranker_model_name, max_length=RERANKER_MAX_LENGTH)
+                except (OSError, ImportError) as e:
+                    # A failed model download or missing torch install degrades the same way as a missing ONNX export.
+                    logging.error("Could not load reranker '%s', reranking is now DISABLED: %s", self.reranker_model_name, e)
+                    self.use_reranker = False
+                    return
             logging.info("Reranker model loaded.")
 
 
     async def expand_query(self, user_query: str) -> list[str]:
-        # This method remains unchanged
+        return (await self._expand_query(user_query))[0]
+
+    @timed_stage("expand_query")
+    async def _expand_query(self, user_query: str) -> tuple[list[str], bool]:
+        """Returns (subqueries, degraded); degraded means expansion failed and fell back to the raw query."""
+        if self.expansion_bypass:
+            expand, reason = needs_expansion(user_query, max_words=EXPANSION_BYPASS_MAX_WORDS)
+            logging.info("Expansion decision: %s (%s) for query '%s'", "expand" if expand else "skip", reason, user_query)
+            if not expand:
+                return [user_query], False
+
+        cached = await self.expansion_cache.aget_subqueries(user_query, self._expansion_prompt_hash)
+        if cached is not None:
+            return cached, False
+
         sys_prompt = self.prompts["query_expansion"]["system_prompt"]
         user_prompt = self.prompts["query_expansion"]["user_prompt_template"].format(query_text=user_query)
         try:
-            response = await self.async_client.chat.completions.create(model="gpt-4o", messages=[{"role": "system", "content": sys_prompt}, {"role": "user", "content": user_prompt}])
+            response = await self.async_client.chat.completions.create(model=self.expansion_model, messages=[{"role": "system", "content": sys_prompt}, {"role": "user", "content": user_prompt}])
             expanded = response.choices[0].message.content.strip()
             subqueries = json.loads(expanded)
-            return subqueries
         except (json.JSONDecodeError, openai.APIError) as e:
             logging.warning("Query expansion failed, using original query. Error: %s", str(e))
-            return [user_query]
+            return [user_query], True
+        # Only cache well-formed expansions; fallbacks are retried next time.
+        if not isinstance(subqueries, list) or not subqueries or not all(isinstance(q, str) for q in subqueries):
+            logging.warning("Query expansion returned %r instead of a list of strings, using original query.", subqueries)
+            return [user_query], True
+        await self.expansion_cache.aset_subqueries(user_query, self._expansion_prompt_hash, subqueries)
+        return subqueries, False
 
-    async def retrieve(self, queries: list[str], k: int = 8) -> list[dict]:
+    async def _embed_one(self, q: str) -> list[float] | None:
+        """Embeds a single query, returning None if the API call fails."""
+        try:
+            with stage_timer("embedding_single"):
+                embedding_response = await self.async_client.embeddings.create(
+                    input=[q],
+                    model=self.embedding_model
+                )
+            return embedding_response.data[0].embedding
+        except openai.APIError as e:
+            logging.error(f"Failed to generate embedding for query '{q}': {e}")
+            return None
+
+    async def _embed_queries(self, queries: list[str]) -> list[list[float] | None]:
         """
-        Retrieves relevant chunks from the Pinecone vector store.
-        Embeds queries before sending to Pinecone.
+        Embeds all queries in a single batched request and maps the vectors back
+        by position. Cached vectors are reused and only misses are sent to the API.
+        Queries the batch could not embed are retried one by one; entries that
+        still fail come back as None.
         """
-        retrieved_chunks = []
-        for q in queries:
-            # Generate embedding for the query using OpenAI's embedding API
-            try:
+        embeddings: list[list[float] | None] = [None] * len(queries)
+        for i, q in enumerate(queries):
+            cached = self.embedding_cache.get_vector(q, self.embedding_model)
+            if cached is not None:
+                embeddings[i] = cached.tolist()
+
+        pending = [i for i, emb in enumerate(embeddings) if emb is None]
+        if not pending:
+            return embeddings
+
+        try:
+            with stage_timer("embedding_batch"):
                 embedding_response = await self.async_client.embeddings.create(
-                    input=[q],
+                    input=[queries[i] for i in pending],
                     model=self.embedding_model
                 )
-                query_embedding = embedding_response.data[0].embedding
-            except openai.APIError as e:
-                logging.error(f"Failed to generate embedding for query '{q}': {e}")
-                continue # Skip this query if embedding fails
-
-            # Call Pinecone's query_vectors method
-            # Use asyncio.to_thread as Pinecone client methods can be blocking
-            pinecone_results = await asyncio.to_thread(
-                self.vector_store.query_vectors,
+            for item in embedding_response.data:
+                embeddings[pending[item.index]] = item.embedding
+        except openai.APIError as e:
+            logging.warning(f"Batched embedding of {len(pending)} queries failed, retrying individually: {e}")
+
+        missing = [i for i in pending if embeddings[i] is None]
+        if missing:
+            retried = await asyncio.gather(*(self._embed_one(queries[i]) for i in missing))
+            for i, emb in zip(missing, retried):
+                embeddings[i] = emb
+
+        for i in pending:
+            if embeddings[i] is not None:
+                self.embedding_cache.set_vector(queries[i], self.embedding_model, embeddings[i])
+        return embeddings
+
+    async def _query_store(self, q: str, query_embedding: list[float], k: int) -> list[dict]:
+        """Fetches the top-k chunks for one embedded subquery from the vector store."""
+        # Async-native query: no default thread pool hop per subquery
+        with stage_timer("vector_query"):
+            pinecone_results = await self.vector_store.aquery_vectors(
                 query_embedding=query_embedding,
-                top_k=k
+                top_k=k,
+                include_values=self.use_mmr, # MMR needs the chunk vectors
             )
 
-            # Process results to match the expected format for the rest of the pipeline
-            for chunk_data in pinecone_results:
+        if self.bm25_index is not None:
+            # Hybrid: fuse dense and lexical rankings, keeping the top k. Cosine and
+            # BM25 scores are not comparable, so the hybrid RRF score becomes the chunk score.
+            with stage_timer("bm25_query"):
+                lexical_results = self.bm25_index.query(q, top_k=k)
+            pinecone_results = [
+                {**chunk_data, "score": chunk_data["fusion_score"]}
+                for chunk_data in fuse_results(
+                    [pinecone_results, lexical_results],
+                    method="rrf",
+                    key=lambda chunk_data: chunk_data.get("page_content", ""),
+                    k=RRF_K,
+                )[:k]
+            ]
+
+        # Process results to match the expected format for the rest of the pipeline
+        return [
+            {
                 # PineconeVectorStore returns 'page_content' and 'metadata'
-                retrieved_chunks.append({
-                    "text": chunk_data.get("page_content", ""), # Use .get for safety
-                    "metadata": chunk_data.get("metadata", {}),
-                    "query": q # Keep track of the original query that retrieved this chunk
-                })
-        return retrieved_chunks
+                "id": chunk_data.get("id"),
+                "text": chunk_data.get("page_content", ""), # Use .get for safety
+                "metadata": chunk_data.get("metadata", {}),
+                "score": chunk_data.get("score"), # Similarity from the store (hybrid: RRF score)
+                "query": q, # Keep track of the original query that retrieved this chunk
+                "embedding": chunk_data.get("values"), # Only present when requested (MMR)
+            }
+            for chunk_data in pinecone_results
+        ]
+
+    async def retrieve(self, queries: list[str], k: int = 8) -> list[dict]:
+        """
+        Retrieves relevant chunks for all subqueries and fuses the per-subquery
+        rankings into one deduplicated list (see `fusion_method`).
+        """
+        result_lists, _ = await self._retrieve_lists(queries, k)
+        return self._fuse(result_lists)
+
+    def _fuse(self, result_lists: list[list[dict]]) -> list[dict]:
+        with stage_timer("fusion"):
+            return fuse_results(result_lists, method=self.fusion_method, k=RRF_K)
 
+    async def _retrieve_lists(self, queries: list[str], k: int = 8) -> tuple[list[list[dict]], bool]:
+        """
+        Retrieves relevant chunks from the vector store, one ranked list per subquery.
+        All subqueries are embedded in one batched request, then queried
+        concurrently (bounded by `retrieval_concurrency`); lists keep the order
+        of `queries`, and a failing subquery is logged and skipped. Returns
+        (lists, degraded), where degraded means some subquery was skipped.
+        """
+        embeddings = await self._embed_queries(queries)
+        # Skip queries that could not be embedded
+        embedded = [(q, emb) for q, emb in zip(queries, embeddings) if emb is not None]
+
+        semaphore = asyncio.Semaphore(self.retrieval_concurrency)
+
+        async def bounded(q: str, query_embedding: list[float]) -> list[dict]:
+            async with semaphore:
+                return await self._query_store(q, query_embedding, k)
+
+        results = await asyncio.gather(*(bounded(q, emb) for q, emb in embedded), return_exceptions=True)
+
+        result_lists = []
+        for (q, _), result in zip(embedded, results):
+            if isinstance(result, BaseException):
+                logging.error(f"Retrieval failed for query '{q}': {result}")
+                continue
+            result_lists.append(result)
+        return result_lists, len(result_lists) < len(queries)
+
+    def _predict_pairs(self, pairs: list[tuple[str, str]]):
+        """Scores (query, chunk text) pairs with the loaded cross-encoder; runs on the inference executor."""
+        return self.cross_encoder.predict(pairs, batch_size=RERANKER_BATCH_SIZE, show_progress_bar=False)
+
+    @timed_stage("rerank")
     async def rerank(self, user_query: str, retrieved_chunks: list[dict], top_n: int = 6) -> list[dict]:
         """Asynchronously reranks retrieved chunks, loading the model on first use."""
         if not retrieved_chunks:
             return []
 
         await self._load_reranker()
+        if self.cross_encoder is None:
+            return retrieved_chunks[:top_n]
 
-        pairs = [(user_query, chunk["text"]) for chunk in retrieved_chunks]
-        scores = await asyncio.to_thread(self.cross_encoder.predict, pairs, show_progress_bar=False)
+        # Only pairs not scored before (same normalized query, same chunk) go to the model.
+        scores = self.rerank_cache.get_scores(user_query, retrieved_chunks, self._reranker_cache_key)
+        misses = [i for i, score in enumerate(scores) if score is None]
+        if misses:
+            pairs = [(user_query, retrieved_chunks[i]["text"]) for i in misses]
+            try:
+                if self.rerank_batcher is not None:
+                    fresh = await self.rerank_batcher.predict(pairs)
+                else:
+                    fresh = await self.inference_executor.try_run(self._predict_pairs, pairs)
+            except ExecutorSaturated as e:
+                # Keep latency bounded under load: answer from retrieval order instead of queueing.
+                logging.warning("Skipping reranking, inference executor saturated: %s", e)
+                return retrieved_chunks[:top_n]
+            self.rerank_cache.set_scores(user_query, [retrieved_chunks[i] for i in misses], self._reranker_cache_key, fresh)
+            for i, score in zip(misses, fresh):
+                scores[i] = float(score)
+        logging.info("Reranked %d chunks (%d scored, %d from cache).", len(scores), len(misses), len(scores) - len(misses))
 
         scored_chunks = list(zip(retrieved_chunks, scores))
         reranked = sorted(scored_chunks, key=lambda x: x[1], reverse=True)[:top_n]
         return [chunk for chunk, score in reranked]
 
+    @timed_stage("generate_answer")
     async def generate_answer(self, user_query: str, context_chunks: list[dict]):
         sys_prompt = self.prompts["answer_generation"]["system_prompt"]
         def format_chunk_for_context(chunk: dict) -> str:
@@ -139,36 +390,251 @@ class RagPipeline:
             if content := chunk.choices[0].delta.content:
                 yield content
 
-    async def _get_full_pipeline_response(self, user_query: str) -> list[dict]:
-        """Helper to run the retrieval and optional reranking pipeline."""
-        # This value was the default in the rerank method.
-        TOP_N_FINAL_CHUNKS = 6
+    async def _speculative_retrieve(self, user_query: str) -> tuple[list[dict], bool]:
+        """
+        Retrieves for the raw query while query expansion runs, then adds results
+        for any new subqueries. If expansion fails or exceeds `expansion_timeout`,
+        the speculative results are used on their own. All lists are fused together.
+        Returns (chunks, degraded), as `_get_full_pipeline_response` does.
+        """
+        speculative_task = asyncio.create_task(self._retrieve_lists([user_query]))
+        try:
+            subqueries, degraded = await asyncio.wait_for(self._expand_query(user_query), timeout=self.expansion_timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Query expansion timed out after %.1fs; answering from speculative retrieval.", self.expansion_timeout)
+            subqueries, degraded = [user_query], True
+        except asyncio.CancelledError:
+            speculative_task.cancel()
+            raise
+        except Exception as e:
+            logging.warning("Query expansion failed; answering from speculative retrieval. Error: %s", e)
+            subqueries, degraded = [user_query], True
+        if not isinstance(subqueries, list) or not all(isinstance(q, str) for q in subqueries):
+            logging.warning("Query expansion returned %r instead of a list of strings; ignoring it.", subqueries)
+            subqueries, degraded = [user_query], True
+
+        seen = {normalize_text(user_query)}
+        remaining = []
+        for q in subqueries:
+            if normalize_text(q) not in seen:
+                seen.add(normalize_text(q))
+                remaining.append(q)
+
+        if not remaining:
+            result_lists, failed = await speculative_task
+        else:
+            (speculative, speculative_failed), (expanded, expanded_failed) = await asyncio.gather(
+                speculative_task, self._retrieve_lists(remaining)
+            )
+            # The user's literal question goes first, so it wins fusion ties.
+            result_lists = speculative + expanded
+            failed = speculative_failed or expanded_failed
+        return self._fuse(result_lists), degraded or failed
+
+    @timed_stage("mmr")
+    async def select_diverse(self, user_query: str, chunks: list[dict], top_n: int = MMR_TOP_N) -> list[dict]:
+        """
+        Reorders and trims `chunks` by maximal marginal relevance so near-duplicate
+        chunks (overlapping windows, repeated video segments) do not crowd the context.
+        Uses the vectors returned by the store; chunks without one (e.g. BM25-only
+        hits) are looked up in the local index if there is one, and otherwise keep
+        their fused position while MMR reorders the others around them.
+        """
+        if len(chunks) <= 1:
+            return chunks
+        missing = [i for i, chunk in enumerate(chunks) if chunk.get("embedding") is None]
+        if missing:
+            found = self.vector_store.vectors_for_texts([chunks[i]["text"] for i in missing])
+            for i, vector in zip(missing, found):
+                chunks[i]["embedding"] = vector
+
+        slots = [i for i, chunk in enumerate(chunks) if chunk.get("embedding") is not None]
+        if len(slots) <= 1:
+            return chunks[:top_n]
+        # Cached when the raw query was itself retrieved for (always with speculative retrieval).
+        query_embedding = (await self._embed_queries([user_query]))[0]
+        if query_embedding is None:
+            return chunks[:top_n]
+        usable = [chunks[i] for i in slots]
+        order = mmr_select(query_embedding, [chunk["embedding"] for chunk in usable], top_n=len(usable), lambda_mult=self.mmr_lambda)
+        diverse = list(chunks)
+        for slot, i in zip(slots, order):
+            diverse[slot] = usable[i]
+        return diverse[:top_n]
+
+    async def _get_full_pipeline_response(self, user_query: str) -> tuple[list[dict], bool]:
+        """
+        Helper to run the retrieval and optional reranking pipeline. Returns
+        (context chunks, degraded); degraded means expansion fell back or a
+        subquery could not be retrieved, so the answer should not be cached.
+        """
+        # Both paths return one list, deduplicated by text and ordered by fused score
+        with stage_timer("retrieval"):
+            if self.speculative_retrieval:
+                unique_chunks, degraded = await self._speculative_retrieve(user_query)
+            else:
+                subqueries, expansion_degraded = await self._expand_query(user_query)
+                result_lists, retrieval_degraded = await self._retrieve_lists(subqueries)
+                unique_chunks = self._fuse(result_lists)
+                degraded = expansion_degraded or retrieval_degraded
 
-        subqueries = await self.expand_query(user_query)
-        retrieved = await self.retrieve(subqueries)
-        # Deduplicate the chunks based on their text content
-        unique_chunks = list({chunk["text"]: chunk for chunk in retrieved}.values())
+        if self.use_mmr:
+            unique_chunks = await self.select_diverse(user_query, unique_chunks)
 
         # --- MODIFIED ---
         # Conditionally execute the reranking step
         if self.use_reranker:
             logging.info("Reranking retrieved chunks...")
-            final_chunks = await self.rerank(user_query, unique_chunks, top_n=TOP_N_FINAL_CHUNKS)
+            ranked_chunks = await self.rerank(user_query, unique_chunks, top_n=len(unique_chunks))
         else:
-            logging.info("Skipping reranking. Taking top chunks from retrieval.")
-            # If not reranking, just take the first N chunks after deduplication.
-            final_chunks = unique_chunks[:TOP_N_FINAL_CHUNKS]
+            logging.info("Skipping reranking. Using retrieval order.")
+            ranked_chunks = unique_chunks
         # --- END MODIFIED ---
 
-        return final_chunks
+        # Fill the prompt up to the token budget in rank order instead of a fixed top-N cut.
+        # Inline: chunks carry token counts from ingestion, so this is cheap and must not
+        # queue behind reranker batches on the inference pool.
+        with stage_timer("pack_context"):
+            final_chunks, used_tokens = pack_context(
+                ranked_chunks,
+                token_budget=self.context_token_budget,
+                encoding_name=CONTEXT_ENCODING,
+                min_chunk_tokens=CONTEXT_MIN_CHUNK_TOKENS,
+            )
+        annotate(retrieved_chunks=len(unique_chunks), context_chunks=len(final_chunks), context_tokens=used_tokens, degraded=degraded)
+        logging.info("Packed %d/%d chunks into %d/%d context tokens.", len(final_chunks), len(ranked_chunks), used_tokens, self.context_token_budget)
+        return final_chunks, degraded
+
+    async def warmup(self) -> dict:
+        """
+        Pays the first-request costs up front: loads the reranker and runs one
+        pair through it, opens pooled OpenAI and vector store connections with
+        a dummy embedding + query, and loads the tiktoken encoding. Steps run
+        concurrently and are best-effort; returns {step: seconds or error}.
+        """
+        async def timed(name: str, step):
+            start = time.perf_counter()
+            try:
+                await step()
+                return name, round(time.perf_counter() - start, 3)
+            except Exception as e:
+                logging.warning("Warmup step '%s' failed: %s", name, e)
+                return name, f"error: {e}"
+
+        async def reranker():
+            await self._load_reranker()
+            if self.cross_encoder is not None:
+                await self.inference_executor.run(self._predict_pairs, [("warmup", "warmup")])
+
+        async def retrieval():
+            # Direct call rather than _embed_queries so the dummy text stays out of the cache
+            response = await self.async_client.embeddings.create(input=["warmup"], model=self.embedding_model)
+            await self.vector_store.aquery_vectors(query_embedding=response.data[0].embedding, top_k=1)
+
+        async def tokenizer():
+            await self.inference_executor.run(get_encoding, CONTEXT_ENCODING)
+
+        steps = [timed("tokenizer", tokenizer), timed("retrieval", retrieval)]
+        if self.use_reranker:
+            steps.append(timed("reranker", reranker))
+        self.warmup_report = dict(await asyncio.gather(*steps))
+        logging.info("Warmup finished: %s", self.warmup_report)
+        return self.warmup_report
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters for the in-process caches."""
+        stats = {
+            "embeddings": self.embedding_cache.stats(),
+            "expansions": self.expansion_cache.stats(),
+            "rerank_scores": self.rerank_cache.stats(),
+        }
+        if self.answer_cache is not None:
+            stats["answers"] = self.answer_cache.stats()
+        return stats
+
+    def _poll_index_generation(self) -> None:
+        """
+        Starts a background check of the vector index generation at most every
+        INDEX_GENERATION_POLL_SECONDS; the answer cache is cleared when it
+        changes. Requests never wait on the check.
+        """
+        now = time.monotonic()
+        if now - self._generation_checked_at < INDEX_GENERATION_POLL_SECONDS:
+            return
+        if self._generation_poll is not None and not self._generation_poll.done():
+            return
+        self._generation_checked_at = now
+
+        async def check():
+            try:
+                self.answer_cache.sync_generation(await self.vector_store.aread_generation())
+            except Exception as e:
+                # Keep the cache; ANSWER_CACHE_TTL_SECONDS still bounds staleness.
+                logging.warning("Could not read the vector index generation: %s", e)
+
+        self._generation_poll = asyncio.create_task(check())
+
+    @timed_stage("answer_cache_lookup")
+    async def _lookup_cached_answer(self, user_query: str) -> tuple[str | None, list[float] | None]:
+        """Returns (cached answer or None, question embedding) from the semantic answer cache."""
+        if self.answer_cache is None:
+            return None, None
+        self._poll_index_generation()
+        question_embedding = (await self._embed_queries([user_query]))[0]
+        if question_embedding is None:
+            return None, None
+        return self.answer_cache.lookup(question_embedding), question_embedding
 
     async def answer(self, user_query: str) -> str:
         """Runs the full pipeline and returns a single answer string."""
-        context_chunks = await self._get_full_pipeline_response(user_query)
-        return await self.generate_answer(user_query, context_chunks)
+        with request_trace("answer"):
+            cached_answer, question_embedding = await self._lookup_cached_answer(user_query)
+            annotate(answer_cache_hit=cached_answer is not None)
+            if cached_answer is not None:
+                return cached_answer
+
+            context_chunks, degraded = await self._get_full_pipeline_response(user_query)
+            answer = await self.generate_answer(user_query, context_chunks)
+            # An answer from missing or partial context would outlive the outage that caused it.
+            if question_embedding is not None and context_chunks and not degraded:
+                self.answer_cache.store(user_query, question_embedding, answer)
+            return answer
+
+    @staticmethod
+    async def _replay_answer(answer: str, chunk_chars: int = ANSWER_REPLAY_CHUNK_CHARS):
+        """Yields a cached answer in small pieces so clients see a normal stream."""
+        for i in range(0, len(answer), chunk_chars):
+            yield answer[i : i + chunk_chars]
+            await asyncio.sleep(0) # Let the server flush each piece
 
     async def answer_stream(self, user_query: str):
         """Runs the full pipeline and yields the answer as a stream of text."""
-        context_chunks = await self._get_full_pipeline_response(user_query)
-        async for token in self.generate_answer_stream(user_query, context_chunks):
-            yield token
\ No newline at end of file
+        trace, trace_token = start_trace("answer_stream")
+        outcome = "error"
+        try:
+            cached_answer, question_embedding = await self._lookup_cached_answer(user_query)
+            annotate(answer_cache_hit=cached_answer is not None)
+            if cached_answer is not None:
+                observe_first_token(trace)
+                async for piece in self._replay_answer(cached_answer):
+                    yield piece
+                outcome = "ok"
+                return
+
+            context_chunks, degraded = await self._get_full_pipeline_response(user_query)
+            tokens = []
+            with stage_timer("generate_answer_stream"):
+                async for token in self.generate_answer_stream(user_query, context_chunks):
+                    if not tokens:
+                        observe_first_token(trace)
+                    tokens.append(token)
+                    yield token
+            outcome = "ok"
+            # Only reached when the stream ran to completion (not on client disconnect).
+            if question_embedding is not None and context_chunks and not degraded:
+                self.answer_cache.store(user_query, question_embedding, "".join(tokens).strip())
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            finish_trace(trace, trace_token, outcome)
\ No newline at end of file
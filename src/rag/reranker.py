@@ -0,0 +1,66 @@
+"""Cross-encoder reranker served from an int8-quantized ONNX export.
+
+`OnnxCrossEncoder` mirrors the part of `sentence_transformers.CrossEncoder`
+the pipeline uses (`predict(pairs, ...)` -> one relevance logit per pair), so
+the two backends are interchangeable. The model directory is produced by
+`python -m src.scripts.export_onnx_reranker` and holds:
+
+``model_quantized.onnx``
+    ms-marco-MiniLM-L-6-v2 with dynamically quantized (int8) weights.
+``tokenizer.json``
+    The matching fast tokenizer.
+"""
+import logging
+import os
+
+import numpy as np
+
+ONNX_MODEL_FILE = "model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class OnnxCrossEncoder:
+    """CPU cross-encoder backed by onnxruntime; pairs are scored in padded batches."""
+
+    def __init__(self, model_dir: str, max_length: int = 256, batch_size: int = 32, intra_op_threads: int = 0):
+        # Imported here so the torch backend does not need onnxruntime installed.
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        tokenizer_path = os.path.join(model_dir, TOKENIZER_FILE)
+        if not (os.path.exists(model_path) and os.path.exists(tokenizer_path)):
+            raise FileNotFoundError(f"ONNX reranker not found in {model_dir} (run src.scripts.export_onnx_reranker)")
+
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        # Query + chunk are cut to max_length (longest side first); batches pad to their longest pair.
+        self.tokenizer.enable_truncation(max_length=max_length, strategy="longest_first")
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads  # 0 = onnxruntime default (all cores)
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logging.info("Loaded ONNX reranker from %s (max_length=%d).", model_path, max_length)
+
+    def _run_batch(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(pairs)
+        features = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        inputs = {name: value for name, value in features.items() if name in self._input_names}
+        logits = self.session.run(None, inputs)[0]
+        return logits.reshape(len(pairs), -1)[:, 0]
+
+    def predict(self, pairs, batch_size: int | None = None, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Returns one relevance score (raw logit) per (query, passage) pair."""
+        pairs = [tuple(pair) for pair in pairs]
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        size = batch_size or self.batch_size
+        return np.concatenate([self._run_batch(pairs[i : i + size]) for i in range(0, len(pairs), size)]).astype(np.float32)
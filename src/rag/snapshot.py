@@ -0,0 +1,157 @@
+"""On-disk vector snapshot used by LocalVectorStore.
+
+A snapshot is two files sharing a path prefix:
+
+``<prefix>.vec``
+    Fixed 256-byte header (magic, format version, dimension, row count,
+    embedding model, source index generation) followed by ``count x dimension`` little-endian float32
+    rows, already L2-normalized. Opened with ``np.memmap`` so several worker
+    processes share the same page-cache pages and nothing is copied at startup.
+
+``<prefix>.meta``
+    Header (magic, version, count), then ``count + 1`` uint64 offsets, then
+    the concatenated UTF-8 JSON records ``{"id": ..., "metadata": {...}}``.
+    Record ``i`` is ``data[offsets[i]:offsets[i + 1]]`` and is only decoded
+    when it is read.
+"""
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+VEC_MAGIC = b"OVVS"
+META_MAGIC = b"OVVM"
+VEC_HEADER_SIZE = 256
+MODEL_FIELD_SIZE = 128
+# Index generation the snapshot was exported at; zero-filled (unknown) in older files.
+GENERATION_FIELD_SIZE = 64
+_VEC_HEADER = struct.Struct(f"<4sIIQ{MODEL_FIELD_SIZE}s{GENERATION_FIELD_SIZE}s")
+_META_HEADER = struct.Struct("<4sIQ")
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot is missing, corrupt, or incompatible."""
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def write_snapshot(path: str, ids: list[str], vectors, metadatas: list[dict], model: str, generation: str = "") -> None:
+    """
+    Writes `<path>.vec` / `<path>.meta` atomically (temp files + rename).
+    `generation` records the Pinecone index generation the vectors were exported at.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or len(matrix) != len(ids) or len(ids) != len(metadatas):
+        raise SnapshotError("ids, vectors and metadatas must have matching lengths")
+    model_bytes = model.encode("utf-8")
+    if len(model_bytes) > MODEL_FIELD_SIZE:
+        raise SnapshotError(f"Embedding model name longer than {MODEL_FIELD_SIZE} bytes")
+    generation_bytes = generation.encode("utf-8")
+    if len(generation_bytes) > GENERATION_FIELD_SIZE:
+        raise SnapshotError(f"Index generation longer than {GENERATION_FIELD_SIZE} bytes")
+
+    matrix = np.ascontiguousarray(_unit_rows(matrix), dtype="<f4")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    vec_tmp = f"{path}.vec.tmp"
+    with open(vec_tmp, "wb") as f:
+        header = _VEC_HEADER.pack(VEC_MAGIC, SNAPSHOT_VERSION, matrix.shape[1], matrix.shape[0], model_bytes, generation_bytes)
+        f.write(header.ljust(VEC_HEADER_SIZE, b"\0"))
+        f.write(matrix.tobytes())
+
+    records = [
+        json.dumps({"id": id_, "metadata": meta}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for id_, meta in zip(ids, metadatas)
+    ]
+    offsets = np.zeros(len(records) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(r) for r in records], dtype=np.uint64)
+
+    meta_tmp = f"{path}.meta.tmp"
+    with open(meta_tmp, "wb") as f:
+        f.write(_META_HEADER.pack(META_MAGIC, SNAPSHOT_VERSION, len(records)))
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+
+    # Replace metadata last: a reader that sees a new .meta always has the matching .vec.
+    os.replace(vec_tmp, f"{path}.vec")
+    os.replace(meta_tmp, f"{path}.meta")
+
+
+class _SnapshotRecords(Sequence):
+    """Lazily decoded view over one field of the metadata records."""
+
+    def __init__(self, snapshot: "VectorSnapshot", field: str):
+        self._snapshot = snapshot
+        self._field = field
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._snapshot.record(int(i))[self._field]
+
+
+class VectorSnapshot:
+    """Read-only, memory-mapped view of a snapshot written by `write_snapshot`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        vec_path, meta_path = f"{path}.vec", f"{path}.meta"
+        if not (os.path.exists(vec_path) and os.path.exists(meta_path)):
+            raise SnapshotError(f"Vector snapshot not found at {path}.vec/.meta")
+
+        with open(vec_path, "rb") as f:
+            raw = f.read(_VEC_HEADER.size)
+        if len(raw) < _VEC_HEADER.size:
+            raise SnapshotError(f"{vec_path} is truncated")
+        magic, version, dimension, count, model, generation = _VEC_HEADER.unpack(raw)
+        if magic != VEC_MAGIC:
+            raise SnapshotError(f"{vec_path} is not a vector snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+        self.dimension = dimension
+        self.count = count
+        self.model = model.rstrip(b"\0").decode("utf-8")
+        self.generation = generation.rstrip(b"\0").decode("utf-8") or None
+
+        expected_size = VEC_HEADER_SIZE + count * dimension * 4
+        if os.path.getsize(vec_path) != expected_size:
+            raise SnapshotError(f"{vec_path} size does not match its header")
+        self.vectors = (
+            np.memmap(vec_path, dtype="<f4", mode="r", offset=VEC_HEADER_SIZE, shape=(count, dimension))
+            if count
+            else np.empty((0, dimension), dtype=np.float32)
+        )
+
+        with open(meta_path, "rb") as f:
+            self._meta = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_count = _META_HEADER.unpack_from(self._meta, 0)
+        if magic != META_MAGIC or version != SNAPSHOT_VERSION or meta_count != count:
+            raise SnapshotError(f"{meta_path} does not match {vec_path}")
+        self._offsets = np.frombuffer(self._meta, dtype="<u8", count=count + 1, offset=_META_HEADER.size)
+        self._data_start = _META_HEADER.size + (count + 1) * 8
+
+        self.ids = _SnapshotRecords(self, "id")
+        self.metadata = _SnapshotRecords(self, "metadata")
+
+    def record(self, i: int) -> dict:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        start = self._data_start + int(self._offsets[i])
+        end = self._data_start + int(self._offsets[i + 1])
+        return json.loads(self._meta[start:end])
+
+    def records(self):
+        for i in range(self.count):
+            yield self.record(i)
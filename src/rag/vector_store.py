@@ -1,27 +1,124 @@
+import asyncio
 import os
+import threading
+import time
+import httpx
+import numpy as np
 from pinecone import Pinecone, ServerlessSpec
 from src import config
+from src.rag.snapshot import VectorSnapshot, SnapshotError
 import logging
 
 
+# Id of the marker record in config.INDEX_GENERATION_NAMESPACE whose metadata holds the generation
+GENERATION_RECORD_ID = "index-generation"
+
+
+def new_index_generation() -> str:
+    return str(time.time_ns())
+
+
+def to_chunk(metadata: dict, values=None, score: float | None = None, vector_id: str | None = None) -> dict:
+    """Shapes a match (metadata, optional vector, score, id) into the chunk dict returned by `query_vectors`."""
+    chunk_metadata = {
+        "source": metadata.get("source", "N/A"),
+        "page": metadata.get("page", "N/A"),
+    }
+    for field in ("source_detail", "token_count"):
+        if field in metadata:
+            chunk_metadata[field] = metadata[field]
+    chunk = {
+        "id": vector_id,
+        "page_content": metadata.get("text", ""),
+        "metadata": chunk_metadata,
+        "score": float(score) if score is not None else None,
+    }
+    if values is not None:
+        chunk["values"] = values
+    return chunk
+
+
 class PineconeVectorStore:
     """
     Manages Pinecone index operations including initialization, upserting, and querying.
     This class centralizes all direct interactions with the Pinecone vector database.
     """
 
-    def __init__(self, user_id: str):
-        """Connect to (or create) the single‑tenant OrgVitality index."""
+    def __init__(self, user_id: str, host: str | None = config.PINECONE_INDEX_HOST, lazy: bool = False, http_client: httpx.AsyncClient | None = None):
+        """
+        Connect to (or create) the single‑tenant OrgVitality index.
+
+        With `lazy=True` no control-plane call is made here: if `host` is known
+        the data-plane handle is created immediately, and the existence check
+        and stats are left to `initialize_async()` (or the first query).
+
+        `http_client` (the app's pooled client) enables the async
+        `aquery_vectors` / `aupsert_vectors` path against the REST data plane.
+        """
         self.user_id = user_id
         self.index_name = "index-orgvitality-default"
+        self.host = host
+        self.ready = False
+        self.init_error: str | None = None
+        self._index = None
+        self._init_lock = threading.Lock()
+        self._http_client = http_client
+        # Bounds in-flight async data-plane requests from this process.
+        self._async_semaphore = asyncio.Semaphore(config.PINECONE_MAX_CONCURRENCY)
         self._pc_client = Pinecone(api_key=config.PINECONE_API_KEY)
-        self._initialize_index()
+        if not lazy:
+            self._initialize_index()
+        elif host:
+            self._index = self._pc_client.Index(host=host)
+
+    @property
+    def index(self):
+        """Data-plane handle; initializes synchronously if nothing has connected yet."""
+        if self._index is None:
+            self._initialize_index()
+        return self._index
+
+    async def initialize_async(self):
+        """
+        Runs the deferred existence check and stats off the event loop; sets `ready`.
+        Failed attempts are retried with exponential backoff until one succeeds
+        (or a data-plane query proves the index is reachable, see `_mark_ready`).
+        """
+        delay = 1.0
+        while not self.ready:
+            try:
+                await asyncio.to_thread(self._initialize_index)
+            except Exception as e:
+                self.init_error = str(e)
+                logging.exception("Background Pinecone initialization failed; retrying in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, config.PINECONE_INIT_RETRY_MAX_SECONDS)
+
+    def _mark_ready(self):
+        """A successful data-plane query means the index exists and is reachable."""
+        if not self.ready:
+            self.ready = True
+            self.init_error = None
+            logging.info("Pinecone index '%s' answered a query; marking it ready.", self.index_name)
 
     # ------------------------------------------------------------------
     # Private helpers
     # ------------------------------------------------------------------
 
     def _initialize_index(self):
+        with self._init_lock:
+            if self.ready:
+                return
+            self._ensure_index_exists()
+            if self.host is None:
+                self.host = self._pc_client.describe_index(self.index_name).host
+            if self._index is None:
+                self._index = self._pc_client.Index(host=self.host) if self.host else self._pc_client.Index(self.index_name)
+            logging.info("Pinecone index stats: %s", self._index.describe_index_stats())
+            self.ready = True
+            self.init_error = None
+
+    def _ensure_index_exists(self):
         if self.index_name not in self._pc_client.list_indexes().names():
             print(f"Creating Pinecone index: {self.index_name}")
             self._pc_client.create_index(
@@ -34,9 +131,6 @@ class PineconeVectorStore:
         else:
             print(f"Connecting to existing Pinecone index: {self.index_name}")
 
-        self.index = self._pc_client.Index(self.index_name)
-        print("Pinecone index stats:", self.index.describe_index_stats())
-
     # ---- new: safe batched upsert -----------------------------------
 
     @staticmethod
@@ -64,6 +158,7 @@ class PineconeVectorStore:
             self._upsert_batched(vectors)
         else:
             self.index.upsert(vectors=vectors)
+        self.index.upsert(vectors=[self._generation_record()], namespace=config.INDEX_GENERATION_NAMESPACE)
         print("✅ Upsert complete.")
 
     # ------------------------------------------------------------------
@@ -73,6 +168,7 @@ class PineconeVectorStore:
         query_embedding: list[float],
         top_k: int,
         metadata_filter: dict | None = None,
+        include_values: bool = False,
     ) -> list[dict]:
         """Semantic search helper (unchanged)."""
         if not query_embedding:
@@ -84,19 +180,408 @@ class PineconeVectorStore:
             vector=query_embedding,
             top_k=top_k,
             include_metadata=True,
+            include_values=include_values,
             filter=metadata_filter,
         )
 
-        chunks = []
-        for match in query_response.matches:
-            chunks.append(
-                {
-                    "page_content": match.metadata.get("text", ""),
-                    "metadata": {
-                        "source": match.metadata.get("source", "N/A"),
-                        "page": match.metadata.get("page", "N/A"),
-                    },
-                }
-            )
+        chunks = [
+            to_chunk(match.metadata, match.values if include_values else None, match.score, match.id)
+            for match in query_response.matches
+        ]
+        self._mark_ready()
         print(f"Retrieved {len(chunks)} chunks from Pinecone.")
         return chunks
+
+    # ---- index generation (cache invalidation across instances) ---------
+
+    @staticmethod
+    def _generation_record() -> dict:
+        # Pinecone rejects all-zero vectors under the cosine metric, hence the single 1.0.
+        values = [1.0] + [0.0] * (config.EMBEDDING_DIMENSION - 1)
+        return {"id": GENERATION_RECORD_ID, "values": values, "metadata": {"generation": new_index_generation()}}
+
+    def read_generation(self) -> str | None:
+        """Generation written by the last upsert from any machine, or None if never written."""
+        response = self.index.fetch(ids=[GENERATION_RECORD_ID], namespace=config.INDEX_GENERATION_NAMESPACE)
+        record = response.vectors.get(GENERATION_RECORD_ID)
+        return (record.metadata or {}).get("generation") if record else None
+
+    async def aread_generation(self) -> str | None:
+        if self._http_client is None or not self.host:
+            return await asyncio.to_thread(self.read_generation)
+        async with self._async_semaphore:
+            response = await self._http_client.get(
+                self._rest_url("/vectors/fetch"),
+                params={"ids": GENERATION_RECORD_ID, "namespace": config.INDEX_GENERATION_NAMESPACE},
+                headers={
+                    "Api-Key": config.PINECONE_API_KEY or "",
+                    "X-Pinecone-API-Version": config.PINECONE_API_VERSION,
+                },
+            )
+        response.raise_for_status()
+        record = response.json().get("vectors", {}).get(GENERATION_RECORD_ID)
+        return (record.get("metadata") or {}).get("generation") if record else None
+
+    def vectors_for_texts(self, texts: list[str]) -> list[None]:
+        """No local copy of the index: vectors only come back attached to query results."""
+        return [None] * len(texts)
+
+    # ---- async data-plane path -----------------------------------------
+
+    def _rest_url(self, path: str) -> str:
+        host = self.host if self.host.startswith("http") else f"https://{self.host}"
+        return f"{host}{path}"
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        async with self._async_semaphore:
+            response = await self._http_client.post(
+                self._rest_url(path),
+                json=payload,
+                headers={
+                    "Api-Key": config.PINECONE_API_KEY or "",
+                    "X-Pinecone-API-Version": config.PINECONE_API_VERSION,
+                },
+            )
+        response.raise_for_status()
+        return response.json()
+
+    async def aquery_vectors(
+        self,
+        query_embedding: list[float],
+        top_k: int,
+        metadata_filter: dict | None = None,
+        include_values: bool = False,
+    ) -> list[dict]:
+        """Async `query_vectors` over the pooled HTTP client; no thread pool involved."""
+        if self._http_client is None or not self.host:
+            # No pooled client or host yet: fall back to the blocking SDK off-loop.
+            return await asyncio.to_thread(self.query_vectors, query_embedding, top_k, metadata_filter, include_values)
+        if not query_embedding:
+            logging.warning("Query embedding is empty. Cannot perform query.")
+            return []
+
+        payload = {"vector": list(query_embedding), "topK": top_k, "includeMetadata": True, "includeValues": include_values}
+        if metadata_filter:
+            payload["filter"] = metadata_filter
+        body = await self._post("/query", payload)
+        self._mark_ready()
+        return [
+            to_chunk(
+                match.get("metadata") or {},
+                match.get("values") if include_values else None,
+                match.get("score"),
+                match.get("id"),
+            )
+            for match in body.get("matches", [])
+        ]
+
+    async def aupsert_vectors(self, vectors: list[dict], batch: int = 80):
+        """Async `upsert_vectors` over the pooled HTTP client, in <=2 MB batches."""
+        if self._http_client is None or not self.host:
+            return await asyncio.to_thread(self.upsert_vectors, vectors)
+        if not vectors:
+            return
+        await asyncio.gather(*(self._post("/vectors/upsert", {"vectors": slice_}) for slice_ in self._chunk(vectors, batch)))
+        await self._post(
+            "/vectors/upsert", {"vectors": [self._generation_record()], "namespace": config.INDEX_GENERATION_NAMESPACE}
+        )
+
+    # ---- export helpers (used by the local snapshot sync) ---------------
+
+    def list_ids(self) -> list[str]:
+        """Pages through every vector ID in the index."""
+        ids = []
+        for page in self.index.list():
+            ids.extend(page)
+        return ids
+
+    def fetch_vectors(self, ids: list[str], batch: int = 100) -> dict[str, dict]:
+        """Fetches values and metadata for `ids`, returned as {id: {"values", "metadata"}}."""
+        fetched = {}
+        for slice_ in self._chunk(ids, batch):
+            response = self.index.fetch(ids=slice_)
+            for vector_id, vector in response.vectors.items():
+                fetched[vector_id] = {"values": vector.values, "metadata": vector.metadata or {}}
+        return fetched
+
+
+# ----------------------------------------------------------------------
+# Local in-memory index
+# ----------------------------------------------------------------------
+
+_COMPARATORS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def _matches_filter(metadata: dict, metadata_filter: dict) -> bool:
+    """Evaluates a Pinecone-style metadata filter ($eq, $in, $and, ...) against one record."""
+    for field, condition in metadata_filter.items():
+        if field == "$and":
+            if not all(_matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(field)
+            for op, operand in condition.items():
+                if op == "$exists":
+                    if (field in metadata) != bool(operand):
+                        return False
+                elif op not in _COMPARATORS:
+                    raise ValueError(f"Unsupported metadata filter operator: {op}")
+                elif not _COMPARATORS[op](value, operand):
+                    return False
+        elif metadata.get(field) != condition:
+            return False
+    return True
+
+
+class LocalVectorStore:
+    """
+    In-process drop-in for PineconeVectorStore (same `upsert_vectors` /
+    `query_vectors` interface) for small corpora and offline testing.
+
+    Vectors are kept in a contiguous float32 matrix with unit-norm rows, so
+    cosine similarity is a single matrix-vector product; top-k uses
+    `argpartition` instead of a full sort.
+    """
+
+    def __init__(self, dimension: int = config.EMBEDDING_DIMENSION):
+        self.index_name = "local"
+        self.dimension = dimension
+        self._matrix = np.empty((0, dimension), dtype=np.float32)
+        self._size = 0
+        self._ids: list[str] = []
+        self._metadata: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._text_positions: dict[str, int] | None = None  # Built on first `vectors_for_texts`
+        self.generation = new_index_generation()  # In-process only; changes on every upsert
+        self.ready = True
+
+    @classmethod
+    def from_snapshot(cls, path: str, expected_model: str | None = config.EMBEDDING_MODEL) -> "LocalVectorStore":
+        """
+        Opens a snapshot written by `src.rag.snapshot.write_snapshot`. The vector
+        matrix stays memory-mapped and metadata is decoded on demand; both are
+        copied into memory only if the store is later upserted into.
+        """
+        snapshot = VectorSnapshot(path)
+        if expected_model and snapshot.model != expected_model:
+            raise SnapshotError(
+                f"Snapshot at {path} was built with '{snapshot.model}', expected '{expected_model}'"
+            )
+        store = cls(dimension=snapshot.dimension)
+        store.index_name = f"local:{os.path.basename(path)}"
+        store._matrix = snapshot.vectors
+        store._size = snapshot.count
+        store._ids = snapshot.ids
+        store._metadata = snapshot.metadata
+        store._positions = None
+        logging.info(f"Loaded vector snapshot {path} ({snapshot.count} x {snapshot.dimension}, model={snapshot.model}).")
+        return store
+
+    def _make_writable(self) -> None:
+        """Copies snapshot-backed (read-only) state into memory before the first write."""
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix[: self._size], dtype=np.float32)
+        if not isinstance(self._ids, list):
+            self._ids = list(self._ids)
+            self._metadata = list(self._metadata)
+        if self._positions is None:
+            self._positions = {id_: i for i, id_ in enumerate(self._ids)}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _reserve(self, capacity: int) -> None:
+        """Grows the backing matrix geometrically so repeated upserts stay amortized O(n)."""
+        if capacity <= self._matrix.shape[0]:
+            return
+        new_capacity = max(capacity, 2 * self._matrix.shape[0], 64)
+        grown = np.empty((new_capacity, self.dimension), dtype=np.float32)
+        grown[: self._size] = self._matrix[: self._size]
+        self._matrix = grown
+
+    def upsert_vectors(self, vectors: list[dict]):
+        """Insert or overwrite vectors given as {"id", "values", "metadata"} dicts."""
+        if not vectors:
+            logging.info("No vectors provided for upsert. Skipping operation.")
+            return
+
+        values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        if values.ndim != 2 or values.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got shape {values.shape}")
+        values = self._normalize_rows(values)
+
+        self._make_writable()
+        self._reserve(self._size + len(vectors))
+        for vector, row in zip(vectors, values):
+            position = self._positions.get(vector["id"])
+            if position is None:
+                position = self._size
+                self._size += 1
+                self._positions[vector["id"]] = position
+                self._ids.append(vector["id"])
+                self._metadata.append(vector.get("metadata", {}))
+            else:
+                self._metadata[position] = vector.get("metadata", {})
+            self._matrix[position] = row
+        self._text_positions = None
+        self.generation = new_index_generation()
+        logging.info(f"Upserted {len(vectors)} vectors into the local index ({self._size} total).")
+
+    def query_vectors(
+        self,
+        query_embedding: list[float],
+        top_k: int,
+        metadata_filter: dict | None = None,
+        include_values: bool = False,
+    ) -> list[dict]:
+        """Cosine top-k search over the in-memory matrix, optionally filtered on metadata."""
+        if not query_embedding or not self._size or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = self._matrix[: self._size] @ (query / norm)
+
+        if metadata_filter:
+            mask = np.fromiter(
+                (_matches_filter(m, metadata_filter) for m in self._metadata),
+                dtype=bool,
+                count=self._size,
+            )
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = np.arange(self._size)
+        if not len(candidates):
+            return []
+
+        candidate_scores = scores[candidates]
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-candidate_scores, k - 1)[:k]
+        top = top[np.argsort(-candidate_scores[top])]
+        return [
+            to_chunk(
+                self._metadata[candidates[i]],
+                self._matrix[candidates[i]] if include_values else None,
+                candidate_scores[i],
+                self._ids[candidates[i]],
+            )
+            for i in top
+        ]
+
+    def vectors_for_texts(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Stored (unit-norm) vectors of the chunks with these texts; None where a text is not indexed."""
+        if self._text_positions is None:
+            self._text_positions = {meta.get("text"): i for i, meta in enumerate(self._metadata[: self._size])}
+        positions = [self._text_positions.get(text) for text in texts]
+        return [self._matrix[i] if i is not None else None for i in positions]
+
+    async def aread_generation(self) -> str:
+        return self.generation
+
+    # The matrix product is sub-millisecond at this corpus size, so the async
+    # variants run inline rather than hopping to a thread.
+    async def aquery_vectors(
+        self,
+        query_embedding: list[float],
+        top_k: int,
+        metadata_filter: dict | None = None,
+        include_values: bool = False,
+    ) -> list[dict]:
+        return self.query_vectors(query_embedding, top_k, metadata_filter, include_values)
+
+    async def aupsert_vectors(self, vectors: list[dict]):
+        self.upsert_vectors(vectors)
+
+
+class ReplicaVectorStore:
+    """
+    Serves queries from a local snapshot replica and only connects to Pinecone
+    on demand: when no replica is loaded, or a local query fails. Upserts go
+    to Pinecone (the source of truth) and are mirrored into the replica.
+    """
+
+    def __init__(self, local: LocalVectorStore | None, remote_factory):
+        self.local = local
+        self._remote_factory = remote_factory
+        self._remote: PineconeVectorStore | None = None
+        self.index_name = local.index_name if local is not None else "replica"
+        self.ready = True
+
+    @property
+    def remote(self) -> PineconeVectorStore:
+        if self._remote is None:
+            logging.info("Connecting to Pinecone for replica fallback...")
+            self._remote = self._remote_factory()
+        return self._remote
+
+    def upsert_vectors(self, vectors: list[dict]):
+        self.remote.upsert_vectors(vectors)
+        if self.local is not None:
+            self.local.upsert_vectors(vectors)
+
+    def query_vectors(
+        self,
+        query_embedding: list[float],
+        top_k: int,
+        metadata_filter: dict | None = None,
+        include_values: bool = False,
+    ) -> list[dict]:
+        if self.local is not None and len(self.local):
+            try:
+                return self.local.query_vectors(query_embedding, top_k, metadata_filter, include_values)
+            except Exception as e:
+                logging.warning(f"Local replica query failed, falling back to Pinecone: {e}")
+        return self.remote.query_vectors(query_embedding, top_k, metadata_filter, include_values)
+
+    async def aread_generation(self) -> str | None:
+        # Answers come from the replica when there is one, so its contents are what matter.
+        if self.local is not None:
+            return self.local.generation
+        remote = self._remote or await asyncio.to_thread(lambda: self.remote)
+        return await remote.aread_generation()
+
+    def vectors_for_texts(self, texts: list[str]) -> list[np.ndarray | None]:
+        if self.local is None:
+            return [None] * len(texts)
+        return self.local.vectors_for_texts(texts)
+
+    async def aupsert_vectors(self, vectors: list[dict]):
+        await self.remote.aupsert_vectors(vectors)
+        if self.local is not None:
+            self.local.upsert_vectors(vectors)
+
+    async def aquery_vectors(
+        self,
+        query_embedding: list[float],
+        top_k: int,
+        metadata_filter: dict | None = None,
+        include_values: bool = False,
+    ) -> list[dict]:
+        if self.local is not None and len(self.local):
+            try:
+                return self.local.query_vectors(query_embedding, top_k, metadata_filter, include_values)
+            except Exception as e:
+                logging.warning(f"Local replica query failed, falling back to Pinecone: {e}")
+        # Creating the remote store may hit the control plane; keep that off the loop.
+        remote = self._remote or await asyncio.to_thread(lambda: self.remote)
+        return await remote.aquery_vectors(query_embedding, top_k, metadata_filter, include_values)
@@ -0,0 +1,58 @@
+"""Builds the local vector snapshot served by LocalVectorStore.
+
+Embeds every chunk in all_chunks_normalized.json and writes
+`<VECTOR_SNAPSHOT_PATH>.vec` / `.meta` (see src/rag/snapshot.py), so a
+container started with VECTOR_BACKEND=local can serve queries without
+re-embedding anything or talking to Pinecone.
+
+Usage:
+    python -m src.scripts.build_vector_snapshot
+"""
+import json
+import logging
+
+from src.config import (
+    NORMALIZED_CHUNKS_PATH, VECTOR_SNAPSHOT_PATH, EMBEDDING_MODEL, DEFAULT_PINECONE_USER_ID, EMBEDDING_CACHE_SIZE,
+)
+from src.core.embeddings import OpenAIEmbedding
+from src.rag.cache import EmbeddingCache
+from src.rag.snapshot import write_snapshot
+from src.scripts.populate_pinecone import build_vector_metadata
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(levelname)s] %(asctime)s - %(message)s"
+)
+
+EMB_BATCH = 100
+
+
+def build_snapshot(json_file_path: str, snapshot_path: str, user_id: str, embedding_model: str) -> None:
+    with open(json_file_path, "r") as f:
+        chunks = json.load(f)
+
+    valid = [c for c in chunks if isinstance(c.get("text"), str) and c["text"].strip()]
+    if len(valid) < len(chunks):
+        logging.warning(f"Skipping {len(chunks) - len(valid)} chunks with empty text.")
+
+    # Repeated texts (slide headers, boilerplate paragraphs) are embedded once per run.
+    embedder = OpenAIEmbedding(model=embedding_model, cache=EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE))
+    vectors = []
+    for i in range(0, len(valid), EMB_BATCH):
+        vectors.extend(embedder.embed_texts([c["text"] for c in valid[i : i + EMB_BATCH]]))
+        logging.info(f"Embedded {min(i + EMB_BATCH, len(valid))}/{len(valid)} chunks.")
+    logging.info(f"Embedding cache: {embedder.cache.stats()}")
+
+    ids = [f"{user_id}-chunk-{c.get('chunk_id', i)}" for i, c in enumerate(valid)]
+    metadatas = [build_vector_metadata(c) for c in valid]
+    write_snapshot(snapshot_path, ids, vectors, metadatas, model=embedding_model)
+    logging.info(f"Wrote {len(ids)} vectors to {snapshot_path}.vec/.meta")
+
+
+if __name__ == "__main__":
+    build_snapshot(
+        json_file_path=NORMALIZED_CHUNKS_PATH,
+        snapshot_path=VECTOR_SNAPSHOT_PATH,
+        user_id=DEFAULT_PINECONE_USER_ID,
+        embedding_model=EMBEDDING_MODEL,
+    )
@@ -0,0 +1,79 @@
+"""Import-time budget check for the API process.
+
+Imports the app module in a fresh interpreter under `python -X importtime`
+and fails (exit code 1) when the total import time exceeds the budget or
+when a module that should only load on demand (torch, sentence-transformers,
+onnxruntime, ...) is imported at startup. Prints the slowest imports so a
+regression is easy to trace.
+
+Usage:
+    python -m src.scripts.check_import_time [--module src.app] [--budget-ms 3000] [--runs 3]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from src.config import PROJ_ROOT
+
+# Heavy ML stacks that must stay behind lazy imports (see RagPipeline._load_reranker, OnnxCrossEncoder).
+FORBIDDEN_MODULES = ("torch", "transformers", "sentence_transformers", "onnxruntime", "tokenizers")
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module: str) -> list[tuple[str, int, int, int]]:
+    """Returns (module, self us, cumulative us, nesting depth) for every import made by `module`."""
+    env = dict(os.environ)
+    # A dummy key so modules that build API clients at import time don't fail; no request is made.
+    env.setdefault("OPENAI_API_KEY", "import-time-check")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJ_ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="src.app")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "3000")))
+    parser.add_argument("--runs", type=int, default=3, help="Best of N runs, to smooth out disk cache noise")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    # Top-level entries (depth 0) sum to the total import cost of the module.
+    totals = [sum(cumulative for _, _, cumulative, depth in rows if depth == 0) for rows in runs]
+    best = min(range(len(runs)), key=totals.__getitem__)
+    rows, total_ms = runs[best], totals[best] / 1000
+
+    print(f"Import of {args.module}: {total_ms:.0f} ms (best of {len(runs)}, budget {args.budget_ms:.0f} ms)")
+    print("Slowest imports by self time:")
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+
+    failed = False
+    imported = {name.split(".")[0] for name, *_ in rows}
+    heavy = sorted(imported.intersection(FORBIDDEN_MODULES))
+    if heavy:
+        print(f"FAIL: {args.module} eagerly imports {', '.join(heavy)}; import these where they are used.")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time {total_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget.")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Exports the cross-encoder reranker to ONNX and quantizes it to int8.
+
+Writes `model_quantized.onnx` and `tokenizer.json` to RERANKER_ONNX_DIR,
+which is what `src.rag.reranker.OnnxCrossEncoder` loads. Needs torch and
+transformers (dev/build time only); serving only needs onnxruntime and
+tokenizers.
+
+Usage:
+    python -m src.scripts.export_onnx_reranker [--model cross-encoder/ms-marco-MiniLM-L-6-v2] [--out DIR]
+"""
+import argparse
+import logging
+import os
+import tempfile
+
+from src.config import RERANKER_MODEL, RERANKER_ONNX_DIR
+from src.rag.reranker import ONNX_MODEL_FILE, TOKENIZER_FILE
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(levelname)s] %(asctime)s - %(message)s"
+)
+
+
+def export(model_name: str, out_dir: str, opset: int = 17) -> None:
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["what is a heat map"], ["The heat map shows scores by group."], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+            )
+        logging.info("Exported %s to ONNX, quantizing weights to int8...", model_name)
+        quantize_dynamic(fp32_path, os.path.join(out_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, TOKENIZER_FILE))
+    logging.info("Wrote %s and %s to %s", ONNX_MODEL_FILE, TOKENIZER_FILE, out_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=RERANKER_MODEL)
+    parser.add_argument("--out", default=RERANKER_ONNX_DIR)
+    args = parser.parse_args()
+    export(args.model, args.out)
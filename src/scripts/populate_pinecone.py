@@ -1,10 +1,13 @@
 import json
 import asyncio
 import logging
+from functools import lru_cache
+import tiktoken
 from langfuse.openai import openai
 from src.config import (
     PINECONE_API_KEY, PINECONE_REGION, EMBEDDING_DIMENSION,
-    OPENAI_API_KEY, DEFAULT_PINECONE_USER_ID, EMBEDDING_MODEL # Added EMBEDDING_MODEL to import
+    OPENAI_API_KEY, DEFAULT_PINECONE_USER_ID, EMBEDDING_MODEL, # Added EMBEDDING_MODEL to import
+    CONTEXT_ENCODING,
 )
 from src.rag.vector_store import PineconeVectorStore # Your PineconeVectorStore class
 
@@ -13,6 +16,36 @@ logging.basicConfig(
     format="[%(levelname)s] %(asctime)s - %(message)s"
 )
 
+@lru_cache(maxsize=None)
+def _token_encoding() -> tiktoken.Encoding:
+    # Deliberately no character fallback: stored counts must be exact.
+    return tiktoken.get_encoding(CONTEXT_ENCODING)
+
+def build_vector_metadata(chunk: dict) -> dict:
+    """Flattens a normalized chunk into the metadata stored alongside its vector."""
+    # Prepare metadata for Pinecone. Ensure it's flat and JSON-serializable.
+    metadata = {
+        "source": chunk.get("source", "N/A"),
+        "source_detail": chunk.get("source_detail", "N/A"),
+        "text": chunk.get("text", "") # Store the original text to retrieve it later
+    }
+    # Used to pack the answer context to a token budget. Precomputed at normalization;
+    # counted here for chunk files written before normalize_chunks recorded it.
+    if "token_count" in chunk:
+        metadata["token_count"] = chunk["token_count"]
+    elif isinstance(chunk.get("text"), str):
+        metadata["token_count"] = len(_token_encoding().encode(chunk["text"]))
+    # Add other relevant metadata fields from your JSON if needed
+    if 'metadata' in chunk: # If there's nested metadata in your original JSON
+        for k, v in chunk['metadata'].items():
+            # Pinecone accepts basic types, lists, and dicts in metadata directly
+            if isinstance(v, (str, int, float, bool, list, dict)):
+                metadata[k] = v
+            else:
+                # Convert complex types to string to ensure compatibility
+                metadata[k] = str(v)
+    return metadata
+
 async def generate_embeddings(texts: list[str], client: openai.AsyncClient, model: str) -> list[list[float]]:
     """Generates embeddings for a list of texts using OpenAI's API."""
     try:
@@ -81,34 +114,16 @@ async def populate_pinecone_db(json_file_path: str, user_id: str, embedding_mode
         vectors_to_upsert = []
         # Iterate over valid_chunks_in_batch which corresponds to embeddings_batch
         for j, chunk in enumerate(valid_chunks_in_batch):
-            chunk_text = chunk.get("text", "") # Get the text again for preparing metadata
-
             # Ensure 'id' is a string and unique. Using a combination of user_id, chunk_id, batch_index, and item_index
             vector_id = f"{user_id}-chunk-{chunk.get('chunk_id', '')}-{i}-{j}"
             # Fallback if chunk_id is entirely missing or not suitable for ID
             if not chunk.get('chunk_id'):
                 vector_id = f"{user_id}-batch-{i}-idx-{j}" # More unique fallback ID
 
-            # Prepare metadata for Pinecone. Ensure it's flat and JSON-serializable.
-            metadata = {
-                "source": chunk.get("source", "N/A"),
-                "source_detail": chunk.get("source_detail", "N/A"),
-                "text": chunk_text # Store the original text to retrieve it later
-            }
-            # Add other relevant metadata fields from your JSON if needed
-            if 'metadata' in chunk: # If there's nested metadata in your original JSON
-                for k, v in chunk['metadata'].items():
-                    # Pinecone accepts basic types, lists, and dicts in metadata directly
-                    if isinstance(v, (str, int, float, bool, list, dict)):
-                        metadata[k] = v
-                    else:
-                        # Convert complex types to string to ensure compatibility
-                        metadata[k] = str(v)
-
             vectors_to_upsert.append({
                 "id": vector_id,
                 "values": embeddings_batch[j],
-                "metadata": metadata
+                "metadata": build_vector_metadata(chunk)
             })
 
         if vectors_to_upsert:
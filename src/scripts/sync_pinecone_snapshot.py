@@ -0,0 +1,91 @@
+"""Exports the Pinecone index into the local vector snapshot.
+
+Pages through every vector ID in `index-orgvitality-default`, fetches values
+and metadata, and writes `<VECTOR_SNAPSHOT_PATH>.vec` / `.meta` for
+LocalVectorStore / ReplicaVectorStore.
+
+The sync is incremental only while the index is unchanged: every upsert
+writes a new index-generation marker, and the snapshot records the
+generation it was exported at. If the two match, vectors are reused from the
+existing snapshot, only new IDs are fetched and IDs no longer in the index
+are dropped. If they differ (or either is unknown), vectors may have changed
+under their old IDs (IDs are positional), so every vector is re-fetched.
+
+Usage:
+    python -m src.scripts.sync_pinecone_snapshot [--full]
+"""
+import argparse
+import logging
+
+from src.config import VECTOR_SNAPSHOT_PATH, EMBEDDING_MODEL, DEFAULT_PINECONE_USER_ID
+from src.rag.snapshot import VectorSnapshot, SnapshotError, write_snapshot
+from src.rag.vector_store import PineconeVectorStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(levelname)s] %(asctime)s - %(message)s"
+)
+
+
+def _load_existing(snapshot_path: str, embedding_model: str, generation: str | None) -> dict[str, tuple]:
+    """Returns {id: (vector, metadata)} from the current snapshot, or {} if unusable."""
+    try:
+        snapshot = VectorSnapshot(snapshot_path)
+    except SnapshotError as e:
+        logging.info(f"No reusable snapshot ({e}); doing a full export.")
+        return {}
+    if snapshot.model != embedding_model:
+        logging.info(f"Existing snapshot uses '{snapshot.model}', not '{embedding_model}'; doing a full export.")
+        return {}
+    if generation is None or snapshot.generation != generation:
+        logging.info(f"Index generation changed since the snapshot ({snapshot.generation} -> {generation}); doing a full export.")
+        return {}
+    return {
+        record["id"]: (snapshot.vectors[i], record["metadata"])
+        for i, record in enumerate(snapshot.records())
+    }
+
+
+def sync_snapshot(snapshot_path: str, user_id: str, embedding_model: str, full: bool = False) -> None:
+    store = PineconeVectorStore(user_id=user_id)
+
+    # Read before listing: an upsert that lands mid-sync leaves a newer marker, so the next sync refetches.
+    generation = store.read_generation()
+    remote_ids = sorted(store.list_ids())
+    logging.info(f"Pinecone index '{store.index_name}' has {len(remote_ids)} vectors.")
+
+    existing = {} if full else _load_existing(snapshot_path, embedding_model, generation)
+    to_fetch = [vector_id for vector_id in remote_ids if vector_id not in existing]
+    removed = len(set(existing) - set(remote_ids))
+    logging.info(f"Fetching {len(to_fetch)} new vectors; reusing {len(remote_ids) - len(to_fetch)}; dropping {removed}.")
+
+    fetched = store.fetch_vectors(to_fetch)
+
+    ids, vectors, metadatas = [], [], []
+    for vector_id in remote_ids:
+        if vector_id in fetched:
+            vectors.append(fetched[vector_id]["values"])
+            metadatas.append(fetched[vector_id]["metadata"])
+        elif vector_id in existing:
+            vectors.append(existing[vector_id][0])
+            metadatas.append(existing[vector_id][1])
+        else:
+            logging.warning(f"Vector '{vector_id}' was listed but could not be fetched; skipping.")
+            continue
+        ids.append(vector_id)
+
+    write_snapshot(snapshot_path, ids, vectors, metadatas, model=embedding_model, generation=generation or "")
+    logging.info(f"Wrote {len(ids)} vectors to {snapshot_path}.vec/.meta")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="Re-fetch every vector instead of only new IDs.")
+    args = parser.parse_args()
+
+    sync_snapshot(
+        snapshot_path=VECTOR_SNAPSHOT_PATH,
+        user_id=DEFAULT_PINECONE_USER_ID,
+        embedding_model=EMBEDDING_MODEL,
+        full=args.full,
+    )